@@ -9,9 +9,14 @@
 # License: MIT License
 #######################################################################
 
+from weakref import WeakValueDictionary
 from morpy.const import *
 from morpy.exceptions import LanguageExists, MogramExists
 from morpy.core import Language, Mogram
+from morpy.catalog import MogramCatalog
+from morpy import stats as _stats
+from morpy import replication as _replication
+from morpy import index as _index
 
 
 def singleton(cls):
@@ -56,11 +61,20 @@ class Workspace(object):
         # Language definitions
         self.languages = {}
 
-        # Free mograms. E.g., mograms that are not part of language definition
-        self.mograms = {}
+        # Catalog of free mograms, e.g. mograms that are not part of
+        # language definition, and mograms of language definitions.
+        self.catalog = MogramCatalog()
 
-        # MoRP objects by UUID
-        self.by_uuid = {}
+        # MoRP objects by UUID. Objects are referenced weakly so they are
+        # unregistered when they cease to exist.
+        self.by_uuid = WeakValueDictionary()
+
+        # Last applied operation sequence numbers by replication source.
+        self.applied_seqs = {}
+
+        # Objects created by applied deltas by UUID. Kept alive until
+        # their deletion is replicated.
+        self.replicated = {}
 
     def __iter__(self):
         return iter(self.languages.values())
@@ -77,7 +91,7 @@ class Workspace(object):
             return lang in self.languages.values()
 
     @initialise_morp
-    def create_language(self, name):
+    def create_language(self, name, **kwargs):
         '''
         Creates language in this workspace.
         Args:
@@ -85,24 +99,70 @@ class Workspace(object):
         '''
         if name in self.languages:
             raise LanguageExists(name)
-        language = Language(name)
+        language = Language(name, **kwargs)
         self.languages[name] = language
+        self.catalog.add(language.abstract_syntax)
+        if _replication.log is not None:
+            _replication.log.append('language', language.uuid, name,
+                                    language.abstract_syntax.uuid)
         return language
 
+    @property
+    def mograms(self):
+        '''
+        Free mograms by name.
+        '''
+        return self.catalog.by_name
+
     @initialise_morp
-    def create_mogram(self, name, conforms_to):
+    def create_mogram(self, name, conforms_to, **kwargs):
         '''
         Creates mogram in this workspace.
         Args:
-            language(Language): Name of the mogram.
+            name(string): Name of the mogram.
             conforms_to(Language): A language this mogram conforms to.
         '''
-        if name in self.mograms:
+        if name in self.catalog:
             raise MogramExists(name)
-        mogram = Mogram(name, conforms_to=conforms_to)
-        self.mograms[mogram] = mogram
+        mogram = Mogram(name, conforms_to=conforms_to, **kwargs)
+        self.catalog.add(mogram)
+        if _replication.log is not None:
+            _replication.log.track(mogram)
+            _replication.log.append('mogram', mogram.uuid, name,
+                                    getattr(conforms_to, 'uuid', conforms_to),
+                                    True)
         return mogram
 
+    @initialise_morp
+    def add_mogram(self, mogram):
+        '''
+        Registers existing mogram (e.g. a clone) in this workspace.
+        '''
+        if mogram not in self.catalog and _index.name_index is not None:
+            _index.name_index.add_subtree(mogram)
+        self.catalog.add(mogram)
+        if _replication.log is not None:
+            _replication.log.append('catalog', mogram.uuid, True)
+
+    @initialise_morp
+    def remove_mogram(self, mogram):
+        '''
+        Removes mogram from this workspace. Mograms of a language definition
+        are removed from the language as well.
+        Args:
+            mogram(string or Mogram): Name of a free mogram or mogram.
+        '''
+        if isinstance(mogram, str):
+            mogram = self.catalog.by_name[mogram]
+        self.catalog.remove(mogram)
+        language = mogram.language
+        if language is not None:
+            for mograms in (language.concrete_syntaxes, language.generators):
+                if mogram in mograms:
+                    mograms.remove(mogram)
+        if _replication.log is not None:
+            _replication.log.append('catalog', mogram.uuid, False)
+
     def create_MoRP(self):
         '''
         Creates MoRP language in this workspace.
@@ -176,7 +236,7 @@ class Workspace(object):
             containment=True, lower_bound=0, upper_bound=-1,
             uuid=UUID_MODEL_REFERENCES)
 
-        model_properties = model.create_reference(MODEL_PROPERTIES, property,
+        model_properties = model.create_reference(MODEL_PROPERTIES, _property,
             containment=True, lower_bound=0, upper_bound=-1,
             uuid=UUID_MODEL_PROPERTIES)
 
@@ -244,11 +304,13 @@ class Workspace(object):
 
         # MoRP language
         morp_language = Language(name=MORP, uuid=UUID_MORP_LANGUAGE)
-        morp_language.abstract_syntax.contents.extend([mogram, language,
-            model, _property, reference, named_element, multiplicity, ptypes])
+        for toplevel in [mogram, language, model, _property, reference,
+                         named_element, multiplicity, ptypes]:
+            morp_language.abstract_syntax.add_model(toplevel)
 
         self._morp_language = morp_language
         self._morp = morp_language.abstract_syntax
+        self.catalog.add(self._morp)
 
     @property
     @initialise_morp
@@ -287,9 +349,104 @@ class Workspace(object):
         '''
         return self._reference
 
+    @property
+    @initialise_morp
+    def name_index(self):
+        '''
+        Returns the morpy.index.NameIndex of all models, properties and
+        references in the cataloged mograms. Built on first access and
+        kept up to date afterwards.
+        '''
+        if _index.name_index is None:
+            name_index = _index.NameIndex(self)
+            name_index.build()
+            _index.name_index = name_index
+        return _index.name_index
+
+    def drop_name_index(self):
+        '''
+        Discards the name index. It is rebuilt on next access.
+        '''
+        _index.name_index = None
+
     @initialise_morp
     def get_by_uuid(self, uuid):
         '''
         Returns MoRP object registered under given UUID.
         '''
         return self.by_uuid[uuid]
+
+    def enable_stats(self, sink=None, slow_threshold=None):
+        '''
+        Enables instrumentation of lookups and object creation.
+        Args:
+            sink(callable): Called with an event dict for each timed lookup,
+                e.g. morpy.stats.LoggingSink().
+            slow_threshold(float): Only lookups taking at least this many
+                seconds are passed to the sink.
+        Returns:
+            Installed morpy.stats.Statistics instance.
+        '''
+        _stats.collector = _stats.Statistics(sink=sink,
+                                             slow_threshold=slow_threshold)
+        return _stats.collector
+
+    def disable_stats(self):
+        '''
+        Disables instrumentation. Collected data is discarded.
+        '''
+        _stats.collector = None
+
+    @initialise_morp
+    def enable_oplog(self, source=None):
+        '''
+        Enables logging of changes for replication.
+        Args:
+            source(string): Unique identifier of the log. Generated if not
+                given.
+        Returns:
+            Installed morpy.replication.OperationLog instance.
+        '''
+        _replication.log = _replication.OperationLog(source)
+        return _replication.log
+
+    def disable_oplog(self):
+        '''
+        Disables logging of changes. Logged operations are discarded.
+        '''
+        _replication.log = None
+
+    @property
+    def oplog(self):
+        '''
+        Returns active operation log or None.
+        '''
+        return _replication.log
+
+    def export_delta(self, since=0):
+        '''
+        Returns logged operations with sequence numbers greater than `since`
+        encoded for shipping to other workspaces.
+        '''
+        return _replication.log.export_delta(since)
+
+    @initialise_morp
+    def apply_delta(self, data):
+        '''
+        Replays operations exported by other workspace. Already applied
+        operations are skipped.
+        Returns:
+            Number of applied operations.
+        '''
+        return _replication.apply_delta(data, self.applied_seqs,
+                                        self.replicated)
+
+    def stats(self):
+        '''
+        Returns a snapshot of collected statistics as a dict.
+        '''
+        collector = _stats.collector
+        snapshot = collector.snapshot() if collector is not None else {}
+        snapshot['enabled'] = collector is not None
+        snapshot['registry_size'] = len(self.by_uuid)
+        return snapshot
@@ -0,0 +1,170 @@
+#-*- coding: utf-8 -*-
+#######################################################################
+# Name: catalog.py
+# Purpose: Index of workspace mograms
+# Author: Igor R. Dejanovic <igor DOT dejanovic AT gmail DOT com>
+# Copyright: (c) 2013 Igor R. Dejanovic <igor DOT dejanovic AT gmail DOT com>
+# License: MIT License
+#######################################################################
+'''
+Mogram catalog of the workspace. Mograms are indexed by name, by the
+language they conform to and by the language whose definition they are a
+part of. All lookups are O(1).
+'''
+from morpy.const import MORP
+from morpy.exceptions import MogramExists
+
+
+def language_key(value):
+    '''
+    Returns a key identifying the language given as a Language instance,
+    its name or its abstract syntax.
+    '''
+    from morpy import Workspace
+    from morpy.core import Mogram
+    if isinstance(value, Mogram):
+        # Abstract syntax identifies its language.
+        value = value.language or value
+    elif isinstance(value, str):
+        workspace = Workspace()
+        if value in workspace.languages:
+            value = workspace.languages[value]
+        elif value == MORP:
+            value = workspace.morp_language
+    return getattr(value, 'uuid', value)
+
+
+class MogramCatalog(object):
+    '''
+    Index of mograms registered in the workspace.
+
+    Free mograms, i.e. mograms that are not a part of a language definition,
+    must have unique names. Mograms of language definitions (abstract
+    syntaxes, concrete syntaxes and generators) are found through their
+    language.
+
+    Attributes:
+        by_name(dict): Free mograms by name.
+    '''
+    def __init__(self):
+        self.by_name = {}
+        # Mograms keyed by mogram UUID in dicts keyed by language.
+        self._by_conforms_to = {}
+        self._by_language = {}
+        # Index keys of each mogram by mogram UUID.
+        self._keys = {}
+
+    def add(self, mogram):
+        '''
+        Adds the mogram to the catalog.
+        Raises:
+            MogramExists: If a free mogram with the same name is registered.
+        '''
+        keys = self._keys.get(mogram.uuid)
+        if keys is not None:
+            if self._by_conforms_to[keys[1]][mogram.uuid] is mogram:
+                return
+            # Replaced by a new object with the same UUID.
+            self.remove(mogram)
+        language = mogram.language
+        name = mogram.name if language is None else None
+        if name is not None:
+            if name in self.by_name:
+                raise MogramExists(name)
+            self.by_name[name] = mogram
+        conforms_to = language_key(mogram.conforms_to)
+        self._by_conforms_to.setdefault(conforms_to, {})[mogram.uuid] = mogram
+        if language is not None:
+            self._by_language.setdefault(language.uuid, {})[mogram.uuid] = \
+                mogram
+        self._keys[mogram.uuid] = (name, conforms_to,
+                                   language.uuid if language else None)
+
+    def remove(self, mogram):
+        '''
+        Removes the mogram from the catalog.
+        '''
+        name, conforms_to, language = self._keys.pop(mogram.uuid)
+        if name is not None:
+            del self.by_name[name]
+        self._discard(self._by_conforms_to, conforms_to, mogram.uuid)
+        if language is not None:
+            self._discard(self._by_language, language, mogram.uuid)
+
+    def check_name(self, mogram, name):
+        '''
+        Checks that the mogram may be renamed to the given name.
+        Raises:
+            MogramExists: If the mogram is a cataloged free mogram and other
+                free mogram has the given name.
+        '''
+        keys = self._keys.get(mogram.uuid)
+        if keys is not None and keys[0] is not None and \
+                self.by_name.get(name, mogram) is not mogram:
+            raise MogramExists(name)
+
+    def update(self, mogram):
+        '''
+        Reindexes the mogram after a change of its name, language or the
+        language it conforms to. Mograms that are not in the catalog are
+        ignored. Renames must be checked with check_name beforehand.
+        '''
+        if mogram.uuid not in self._keys:
+            return
+        self.remove(mogram)
+        self.add(mogram)
+
+    @staticmethod
+    def _discard(index, key, uuid):
+        mograms = index[key]
+        del mograms[uuid]
+        if not mograms:
+            del index[key]
+
+    def get(self, name, default=None):
+        '''
+        Returns the free mogram with the given name.
+        '''
+        return self.by_name.get(name, default)
+
+    @property
+    def uuids(self):
+        '''
+        Set-like view of the UUIDs of the cataloged mograms.
+        '''
+        return self._keys.keys()
+
+    def conforming_to(self, language):
+        '''
+        Returns a list of mograms conforming to the given language.
+        Args:
+            language(Language, string or Mogram): Language, its name or
+                its abstract syntax.
+        '''
+        return list(self._by_conforms_to.get(language_key(language),
+                                             {}).values())
+
+    def of_language(self, language):
+        '''
+        Returns a list of mograms that are a part of the given language
+        definition.
+        '''
+        return list(self._by_language.get(language_key(language),
+                                          {}).values())
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        for mograms in list(self._by_conforms_to.values()):
+            for mogram in list(mograms.values()):
+                yield mogram
+
+    def __contains__(self, mogram):
+        '''
+        Args:
+            mogram(string or Mogram): Name of a free mogram or mogram.
+        '''
+        if isinstance(mogram, str):
+            return mogram in self.by_name
+        return getattr(mogram, 'uuid', None) in self._keys
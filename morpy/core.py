@@ -7,8 +7,113 @@
 # License: MIT License
 ###############################################################################
 
-from uuid import uuid4
+from binascii import hexlify
+from collections.abc import MutableSequence
+import gc
+from hashlib import sha1
+from itertools import islice
+from operator import attrgetter
+from os import register_at_fork, urandom
+from time import perf_counter
+import weakref
 from morpy.const import UUID_MODEL, MORP
+from morpy.exceptions import AbstractInstantiation
+from morpy import stats
+from morpy import replication
+from morpy import migration
+from morpy import index
+
+
+def tracked_attribute(name, weak=False):
+    '''
+    Creates a property for an attribute that takes part in the content hash
+    of the MoRP object. The value is kept in the instance attribute prefixed
+    with '_' and the object is notified of each change through its
+    `_changed` method once it is constructed. If weak is True the value is
+    referenced weakly (see weak_attribute).
+
+    Instance attributes are read and set with getattr and setattr, never
+    through the instance __dict__. On CPython, accessing __dict__ makes
+    every later attribute access of the instance slower.
+    '''
+    private = '_' + name
+
+    if weak:
+        weak_property = weak_attribute(name)
+
+        def fset(self, value):
+            weak_property.fset(self, value)
+            if self._live:
+                self._changed(name)
+
+        return property(weak_property.fget, fset)
+
+    def fset(self, value):
+        setattr(self, private, value)
+        # Objects under construction have no hashes or observers yet.
+        if self._live:
+            self._changed(name)
+
+    return property(attrgetter(private), fset)
+
+
+def weak_attribute(name):
+    '''
+    Creates a property for an attribute referring to its value weakly. Used
+    for back-pointers (e.g. owner) so that the object graph has no
+    reference cycles and is freed by reference counting. The attribute is
+    None if not set or if the value no longer exists.
+    '''
+    private = '_' + name
+
+    def fget(self):
+        ref = getattr(self, private, None)
+        return None if ref is None else ref()
+
+    def fset(self, value):
+        setattr(self, private, None if value is None else weakref.ref(value))
+
+    return property(fget, fset)
+
+
+def _uuids(count):
+    '''
+    Returns a list of `count` random (version 4) UUID strings. Much faster
+    than calling uuid4 for each one.
+    '''
+    digits = hexlify(urandom(16 * count)).decode('ascii')
+    # Variant bits of the 17th digit.
+    variant = dict((d, '89ab'[int(d, 16) & 3]) for d in '0123456789abcdef')
+    return ['%s-%s-4%s-%s%s-%s' % (digits[i:i + 8], digits[i + 8:i + 12],
+                                   digits[i + 13:i + 16],
+                                   variant[digits[i + 16]],
+                                   digits[i + 17:i + 20], digits[i + 20:i + 32])
+            for i in range(0, 32 * count, 32)]
+
+
+# Fresh UUIDs for new objects, generated in batches by _uuids.
+_uuid_pool = []
+
+# Cleared in forked processes so they don't reuse UUIDs of the parent.
+register_at_fork(after_in_child=_uuid_pool.clear)
+
+
+def _new_uuid():
+    '''
+    Returns a fresh random UUID string.
+    '''
+    try:
+        return _uuid_pool.pop()
+    except IndexError:
+        _uuid_pool.extend(_uuids(1024))
+        return _uuid_pool.pop()
+
+
+def _ident(obj):
+    '''
+    Returns a value identifying the referenced object in content hashes.
+    '''
+    return getattr(obj, 'uuid', obj)
 
 
 class MoRPObject(object):
@@ -25,12 +130,20 @@ class MoRPObject(object):
         meta (MoRPObject): An object that defines this one.
         uuid (UUID): Unique identifier of this object in the MoRP repository.
     '''
+    # Set when construction is finished. Changes are replicated only
+    # for live objects.
+    _live = False
+
+    # Instance attributes copied to clones, in addition to those of the
+    # base classes. Attributes that are not listed are not copied.
+    _cloned = ('_meta', '_uuid', '_live')
+
     def __init__(self, meta, uuid=None):
 
         self._meta = meta
 
         if not uuid:
-            self._uuid = str(uuid4())
+            self._uuid = _new_uuid()
         else:
             self._uuid = uuid
 
@@ -38,6 +151,9 @@ class MoRPObject(object):
         from morpy import Workspace
         Workspace().by_uuid[self._uuid] = self
 
+        if stats.collector is not None:
+            stats.collector.record_created(self)
+
     def __str__(self):
         # Special case for Model
         if self._meta == self:
@@ -59,11 +175,174 @@ class MoRPObject(object):
     def uuid(self):
         return self._uuid
 
+    def _changed(self, attr):
+        '''
+        Called when tracked attribute of this object changes.
+        '''
+        self._invalidate_hash()
+        if replication.log is not None and self._live:
+            replication.log.changed(self, attr)
 
-class MoRPContainer(list):
+    def _invalidate_hash(self):
+        '''
+        Invalidates content hashes affected by a change of this object.
+        '''
+
+
+class MoRPContainer(object):
     '''
-    List specialization used for containing and querying of MoRP objects.
+    Insertion ordered collection used for containing and querying of MoRP
+    objects. It supports list-like API but each object may be contained
+    only once. Membership tests, appending, removal and moves are O(1)
+    while positional access and changes are O(n). It is a MutableSequence
+    but not a list. Adding containers to lists gives lists.
+
+    As with dicts, the container must not be changed while iterating.
     '''
+    def __init__(self, iterable=()):
+        self._items = dict.fromkeys(iterable)
+
+    def append(self, obj):
+        '''
+        Appends the object. If the object is already contained it is moved
+        to the end.
+        '''
+        items = self._items
+        items.pop(obj, None)
+        items[obj] = None
+
+    def extend(self, iterable):
+        for obj in iterable:
+            self.append(obj)
+
+    def insert(self, index, obj):
+        '''
+        Inserts the object before the given position. This operation is O(n).
+        '''
+        objs = [o for o in self._items if o is not obj]
+        objs.insert(index, obj)
+        self._items = dict.fromkeys(objs)
+
+    def remove(self, obj):
+        try:
+            del self._items[obj]
+        except KeyError:
+            raise ValueError("%s is not in the container." % obj)
+
+    def discard(self, obj):
+        '''
+        Removes the object if it is contained.
+        '''
+        self._items.pop(obj, None)
+
+    def pop(self, index=-1):
+        if not self._items:
+            raise IndexError("pop from empty container")
+        if index == -1:
+            return self._items.popitem()[0]
+        obj = self[index]
+        del self._items[obj]
+        return obj
+
+    def move_to_end(self, obj, last=True):
+        '''
+        Moves the contained object to the end in O(1) (or to the beginning
+        in O(n) if last is False).
+        '''
+        items = self._items
+        if last:
+            del items[obj]
+            items[obj] = None
+        else:
+            self.insert(0, obj)
+
+    def clear(self):
+        self._items.clear()
+
+    def _replace(self, objs):
+        '''
+        Replaces contained objects. Objects given more than once are kept
+        at their last position.
+        '''
+        self.clear()
+        self.extend(objs)
+
+    def sort(self, key=None, reverse=False):
+        self._replace(sorted(self, key=key, reverse=reverse))
+
+    def reverse(self):
+        self._replace(list(reversed(self)))
+
+    def copy(self):
+        return MoRPContainer(self._items)
+
+    def index(self, obj):
+        for idx, o in enumerate(self):
+            if o is obj:
+                return idx
+        raise ValueError("%s is not in the container." % obj)
+
+    def count(self, obj):
+        return 1 if obj in self else 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return MoRPContainer(list(self)[index])
+        if index < 0:
+            index = -index - 1
+            objs = reversed(self)
+        else:
+            objs = iter(self)
+        for obj in islice(objs, index, None):
+            return obj
+        raise IndexError("container index out of range")
+
+    def __setitem__(self, index, obj):
+        objs = list(self)
+        objs[index] = obj
+        self._replace(objs)
+
+    def __delitem__(self, index):
+        objs = list(self)
+        del objs[index]
+        self._replace(objs)
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __reversed__(self):
+        return reversed(self._items)
+
+    def __contains__(self, obj):
+        return obj in self._items
+
+    def __eq__(self, other):
+        try:
+            return list(self) == list(other)
+        except TypeError:
+            return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(list(self))
 
     def by_meta(self, meta):
         '''
@@ -72,11 +351,18 @@ class MoRPContainer(list):
         Args:
             meta(MoRPObject)
         '''
+        collector = stats.collector
+        if collector is not None:
+            start = perf_counter()
         if isinstance(meta, str):
-            return MoRPContainer(filter(lambda o: hasattr(o.meta, 'name') \
-                                        and o.meta.name == meta, self))
+            result = MoRPContainer(filter(lambda o: hasattr(o.meta, 'name') \
+                                          and o.meta.name == meta, self))
         else:
-            return MoRPContainer(filter(lambda o: o.meta == meta, self))
+            result = MoRPContainer(filter(lambda o: o.meta == meta, self))
+        if collector is not None:
+            collector.record_query('by_meta', meta, perf_counter() - start,
+                                   len(self))
+        return result
 
     def filter(self, predicate):
         '''
@@ -88,12 +374,113 @@ class MoRPContainer(list):
         return MoRPContainer(filter(predicate, self))
 
 
+MutableSequence.register(MoRPContainer)
+
+
+class WeakMoRPContainer(MoRPContainer):
+    '''
+    MoRPContainer referring to its objects weakly. Objects are removed
+    from the container when they cease to exist.
+    '''
+    # Callback removing references to objects that ceased to exist.
+    # Created on first append.
+    _remove = None
+
+    def __init__(self, iterable=()):
+        self._items = {}
+        if iterable:
+            self.extend(iterable)
+
+    def append(self, obj):
+        items = self._items
+        remove = self._remove
+        if remove is None:
+            selfref = weakref.ref(self)
+
+            def remove(ref):
+                container = selfref()
+                if container is not None:
+                    container._items.pop(ref, None)
+
+            self._remove = remove
+        # Weak references are equal if their referents are equal so the
+        # new reference replaces the existing one.
+        ref = weakref.ref(obj, remove)
+        items.pop(ref, None)
+        items[ref] = None
+
+    def insert(self, index, obj):
+        objs = [o for o in self if o is not obj]
+        objs.insert(index, obj)
+        self._items = {}
+        self.extend(objs)
+
+    def remove(self, obj):
+        try:
+            del self._items[weakref.ref(obj)]
+        except KeyError:
+            raise ValueError("%s is not in the container." % obj)
+
+    def discard(self, obj):
+        self._items.pop(weakref.ref(obj), None)
+
+    def pop(self, index=-1):
+        if not self._items:
+            raise IndexError("pop from empty container")
+        obj = self[index]
+        self.remove(obj)
+        return obj
+
+    def move_to_end(self, obj, last=True):
+        if last:
+            self.remove(obj)
+            self.append(obj)
+        else:
+            self.insert(0, obj)
+
+    def copy(self):
+        return WeakMoRPContainer(self)
+
+    def __iter__(self):
+        # Objects may cease to exist during iteration.
+        for ref in list(self._items):
+            obj = ref()
+            if obj is not None:
+                yield obj
+
+    def __reversed__(self):
+        for ref in list(reversed(self._items)):
+            obj = ref()
+            if obj is not None:
+                yield obj
+
+    def __contains__(self, obj):
+        try:
+            return weakref.ref(obj) in self._items
+        except TypeError:
+            return False
+
+
 class ModelContainer(MoRPObject):
     '''
     Superclass for all MoRP objects that can contain Model instances.
     E.g. Mogram or Model. At the same time it is a factory for models
     and API for querying and finding models inside container.
+
+    Each container has a content hash covering its own state and the
+    content hashes of the contained models (a Merkle tree over the
+    containment hierarchy). Hashes are computed lazily and cached. A change
+    invalidates cached hashes only on the path to the root so after a small
+    change only that path is rehashed. Containment must be changed through
+    add_model/remove_model to keep the hashes valid.
     '''
+    # Owner in the containment hierarchy. Set only for Model instances.
+    owner = weak_attribute('owner')
+    _cloned = ('_owner',)
+
+    # Cached content hash or None if not yet calculated.
+    _content_hash = None
+
     def __init__(self, **kwargs):
         super(ModelContainer, self).__init__(**kwargs)
         self.contents = MoRPContainer()
@@ -105,9 +492,7 @@ class ModelContainer(MoRPObject):
             name(string): The name of the model.
             abstract(bool): Is this model abstract?
         """
-        model = Model(name=name, owner=self, abstract=abstract)
-        self.contents.append(model)
-        return model
+        return Model(name=name, owner=self, abstract=abstract)
 
     def by_name(self, name):
         '''
@@ -115,25 +500,85 @@ class ModelContainer(MoRPObject):
         Args:
             name(string):
         '''
-        for model in self.contents:
-            if model.name == name:
-                return model
-            # Do depth-first search down the containment tree.
-            inner_model = model.by_name(name)
-            if inner_model is not None:
-                return inner_model
+        collector = stats.collector
+        if collector is None:
+            return self._by_name(name)
+        start = perf_counter()
+        model, visited = self._search('name', name)
+        collector.record_query('by_name', name, perf_counter() - start,
+                               visited)
+        return model
 
     def by_uuid(self, uuid):
         '''
         Return contained model with the given uuid.
         '''
-        for model in self.contents:
-            if model.uuid == uuid:
+        collector = stats.collector
+        if collector is None:
+            return self._by_uuid(uuid)
+        start = perf_counter()
+        model, visited = self._search('uuid', uuid)
+        collector.record_query('by_uuid', uuid, perf_counter() - start,
+                               visited)
+        return model
+
+    def query(self, path):
+        '''
+        Returns an iterator over objects selected by the path query starting
+        from this container. See morpy.query.
+        Args:
+            path(string): e.g. 'contents/*[abstract=false]/properties'
+        '''
+        from morpy.query import query
+        return query(self, path)
+
+    # Searches iterate over the container items and read the attributes
+    # directly as they visit every model of the subtree. Models without
+    # contents are not descended into.
+
+    def _by_name(self, name):
+        for model in self.contents._items:
+            if model._name == name:
+                return model
+            # Do depth-first search down the containment tree.
+            if model.contents._items:
+                inner_model = model._by_name(name)
+                if inner_model is not None:
+                    return inner_model
+
+    def _by_uuid(self, uuid):
+        for model in self.contents._items:
+            if model._uuid == uuid:
                 return model
             # Do depth-first search down the containment tree.
-            inner_model = model.by_uuid(uuid)
-            if inner_model is not None:
-                return inner_model
+            if model.contents._items:
+                inner_model = model._by_uuid(uuid)
+                if inner_model is not None:
+                    return inner_model
+
+    def _search(self, attr, value):
+        '''
+        Does depth-first search down the containment tree for the first
+        model whose attribute `attr` equals `value`. Used when
+        instrumentation is enabled as it also counts visited models.
+        Returns:
+            A tuple (model or None, number of visited models).
+        '''
+        visited = 0
+        attr = '_' + attr
+        stack = [iter(self.contents._items)]
+        while stack:
+            for model in stack[-1]:
+                visited += 1
+                if getattr(model, attr) == value:
+                    return model, visited
+                inner = model.contents._items
+                if inner:
+                    stack.append(iter(inner))
+                    break
+            else:
+                stack.pop()
+        return None, visited
 
     def add_model(self, model):
         '''
@@ -143,11 +588,20 @@ class ModelContainer(MoRPObject):
             model(Model)
         '''
         # If model already has an owner remove it from current owner.
-        if model.owner:
-            model.owner.remove_model(model)
+        # Logged as a single move.
+        current = model.owner
+        if current is not None:
+            current._detach_model(model)
 
         self.contents.append(model)
         model.owner = self
+        self._invalidate_hash()
+        if replication.log is not None and model._live:
+            replication.log.moved(model, self)
+        if index.name_index is not None and model._live:
+            # Model may have been created before the index.
+            index.name_index.add(model)
+            index.name_index.add_subtree(model)
 
     def remove_model(self, model):
         '''
@@ -156,8 +610,47 @@ class ModelContainer(MoRPObject):
         Args:
             model(Model)
         '''
+        self._detach_model(model)
+        if replication.log is not None and model._live:
+            replication.log.moved(model, None)
+        if index.name_index is not None and model._live:
+            # Not found until added to a mogram again.
+            index.name_index.add(model)
+            index.name_index.add_subtree(model)
+
+    def _detach_model(self, model):
         self.contents.remove(model)
         model.owner = None
+        self._invalidate_hash()
+
+    @property
+    def content_hash(self):
+        '''
+        Hex digest of the content of this container and all contained
+        models. Two subtrees have equal hashes iff their content is equal.
+        '''
+        content_hash = self._content_hash
+        if content_hash is None:
+            digest = sha1(repr(self._hashed_state()).encode('utf-8'))
+            for model in self.contents:
+                digest.update(model.content_hash.encode('ascii'))
+            content_hash = self._content_hash = digest.hexdigest()
+        return content_hash
+
+    def _hashed_state(self):
+        '''
+        Returns a tuple of values describing this container without its
+        contents. Used for content hash calculation.
+        '''
+        raise NotImplementedError
+
+    def _invalidate_hash(self):
+        node = self
+        # If a hash is not calculated hashes of owners are not calculated
+        # either so we can stop there.
+        while node is not None and node._content_hash is not None:
+            node._content_hash = None
+            node = node.owner
 
     def __iter__(self):
         '''
@@ -181,15 +674,28 @@ class NamedElement(MoRPObject):
     '''
     Element of the MoRP language that has 'name' Property.
     '''
+    name = tracked_attribute('name')
+    _cloned = ('_name',)
+
     def __init__(self, name, **kwargs):
         self.name = name
         super(NamedElement, self).__init__(**kwargs)
 
+    def _changed(self, attr):
+        super(NamedElement, self)._changed(attr)
+        if attr == 'name' and self._live and index.name_index is not None \
+                and isinstance(self, (Model, Property, Reference)):
+            index.name_index.add(self)
+
 
 class Multiplicity(MoRPObject):
     '''
     Element of the MoRP language that has multiplicity.
     '''
+    lower_bound = tracked_attribute('lower_bound')
+    upper_bound = tracked_attribute('upper_bound')
+    _cloned = ('_lower_bound', '_upper_bound')
+
     def __init__(self, lower_bound=1, upper_bound=1, **kwargs):
         self.lower_bound = lower_bound
         self.upper_bound = upper_bound
@@ -210,11 +716,30 @@ class Model(NamedElement, ModelContainer):
         abstract(bool): Is this model instance abstract. An abstract
             instance cannot have instances itself, i.e. meta links cannot
             reference abstract model.
-        super_models (list of Model): A list of models this model inherits
+        super_models (MoRPContainer of Model): Models this model inherits
             from.
+        inherited_models (WeakMoRPContainer of Model): Models that inherit from
+            this model.
         properties (list of Property): A list of properties for this model.
         references (list of Reference): A list of references for this model.
+        meta_version(int): Increased on each change of properties,
+            references or super models of this model or of its super
+            models. Instances are migrated lazily (see morpy.migration).
     '''
+    abstract = tracked_attribute('abstract')
+
+    meta_version = 0
+
+    # Cached (meta version, features) or None.
+    _features = None
+
+    # Contents, features and super models are loaded. False for unloaded
+    # proxies (see morpy.proxy).
+    loaded = True
+
+    # Containers and features are rewired by clone.
+    _cloned = ('_abstract', 'meta_version')
+
     def __init__(self, name, owner=None, abstract=False, super_models=None,
                  properties=None, references=None, **kwargs):
         '''
@@ -236,15 +761,21 @@ class Model(NamedElement, ModelContainer):
         if owner:
             owner.add_model(self)
 
-        self.super_models = []
+        self.super_models = MoRPContainer()
+        self.inherited_models = WeakMoRPContainer()
         if super_models:
             for super_model in super_models:
                 self.add_super_model(super_model)
-        self.inherited_models = []
 
         self.properties = properties or []
         self.references = references or []
 
+        self._live = True
+        if replication.log is not None:
+            replication.log.created(self)
+        if index.name_index is not None:
+            index.name_index.add(self)
+
     def get_top_level_model(self):
         '''
         Returns model at the top of the owner hierarchy.
@@ -254,19 +785,144 @@ class Model(NamedElement, ModelContainer):
             top_level = top_level.owner
         return top_level
 
+    def clone(self, owner=None):
+        '''
+        Returns a copy of this model and all its inner models, properties
+        and references with fresh UUIDs. References between copied objects
+        are rewired to the copies. Types and super models outside of the
+        copied subtree are kept. Opposites outside of it are not, as they
+        stay paired with the originals, so such copied references have no
+        opposite.
+        Args:
+            owner(ModelContainer): Owner of the copy. If not given the copy
+                has no owner.
+        '''
+        return _clone(self, owner=owner)
+
+    def create_instance(self, **values):
+        '''
+        Creates an instance of this model with the given feature values.
+        '''
+        if self.abstract:
+            raise AbstractInstantiation(self.name)
+        return ModelInst(meta=self, values=values)
+
+    @property
+    def features(self):
+        '''
+        Dict of properties and references of this model, including inherited
+        ones, by name. Cached until the meta version changes.
+        '''
+        cached = self._features
+        if cached is None or cached[0] != self.meta_version:
+            features = {}
+            for super_model in reversed(self.super_models):
+                features.update(super_model.features)
+            for feature in self.properties + self.references:
+                features[feature.name] = feature
+            cached = self._features = (self.meta_version, features)
+        return cached[1]
+
+    def _meta_changed(self):
+        '''
+        Increases the meta version of this model and of the models
+        inheriting from it. Called when features or super models change.
+        '''
+        if not self.inherited_models:
+            self.meta_version += 1
+            return
+        for model in migration.specializations(self):
+            model.meta_version += 1
+
     def create_reference(self, name, type, containment=False, opposite=None,  # @ReservedAssignment @IgnorePep8
                          **kwargs):  # @IgnorePep8
         reference = Reference(name=name, type=type, owner=self,
                               containment=containment, opposite=opposite,
                               **kwargs)
         self.references.append(reference)
+        self._invalidate_hash()
+        self._meta_changed()
         return reference
 
     def create_property(self, name, type, **kwargs):  # @ReservedAssignment
         prop = Property(name=name, type=type, owner=self, **kwargs)
         self.properties.append(prop)
+        self._invalidate_hash()
+        self._meta_changed()
         return prop
 
+    def add_property(self, prop):
+        '''
+        Adds property to this model. If the property is owned by other
+        model it is removed from it first.
+        Args:
+            prop(Property)
+        '''
+        if prop.owner is not None:
+            prop.owner._detach_property(prop)
+        self.properties.append(prop)
+        prop.owner = self
+        self._invalidate_hash()
+        self._meta_changed()
+        if replication.log is not None:
+            replication.log.moved(prop, self)
+        if index.name_index is not None:
+            index.name_index.add(prop)
+
+    def remove_property(self, prop):
+        '''
+        Removes property from this model.
+        Args:
+            prop(Property)
+        '''
+        self._detach_property(prop)
+        if replication.log is not None:
+            replication.log.moved(prop, None)
+        if index.name_index is not None:
+            index.name_index.add(prop)
+
+    def _detach_property(self, prop):
+        self.properties.remove(prop)
+        prop.owner = None
+        self._invalidate_hash()
+        self._meta_changed()
+
+    def add_reference(self, reference):
+        '''
+        Adds reference to this model. If the reference is owned by other
+        model it is removed from it first.
+        Args:
+            reference(Reference)
+        '''
+        if reference.owner is not None:
+            reference.owner._detach_reference(reference)
+        self.references.append(reference)
+        reference.owner = self
+        self._invalidate_hash()
+        self._meta_changed()
+        if replication.log is not None:
+            replication.log.moved(reference, self)
+        if index.name_index is not None:
+            index.name_index.add(reference)
+
+    def remove_reference(self, reference):
+        '''
+        Removes reference from this model.
+        Args:
+            reference(Reference)
+        '''
+        self._detach_reference(reference)
+        if replication.log is not None:
+            replication.log.moved(reference, None)
+        if index.name_index is not None:
+            index.name_index.add(reference)
+
+    def _detach_reference(self, reference):
+        self.references.remove(reference)
+        reference.owner = None
+        self._invalidate_hash()
+        self._meta_changed()
+
     def add_super_model(self, super_model):
         '''
         Adds given model to the collection of super models for this model
@@ -276,6 +932,10 @@ class Model(NamedElement, ModelContainer):
         '''
         self.super_models.append(super_model)
         super_model.inherited_models.append(self)
+        self._invalidate_hash()
+        self._meta_changed()
+        if replication.log is not None and self._live:
+            replication.log.super_changed(self, super_model, True)
 
     def remove_super_model(self, super_model):
         '''
@@ -287,6 +947,16 @@ class Model(NamedElement, ModelContainer):
         if super_model in self.super_models:
             self.super_models.remove(super_model)
             super_model.inherited_models.remove(self)
+            self._invalidate_hash()
+            self._meta_changed()
+            if replication.log is not None and self._live:
+                replication.log.super_changed(self, super_model, False)
+
+    def _hashed_state(self):
+        return ('Model', self.uuid, self.name, self.abstract,
+                tuple(p._hashed_state() for p in self.properties),
+                tuple(r._hashed_state() for r in self.references),
+                tuple(m.uuid for m in self.super_models))
 
 
 class Property(Multiplicity, NamedElement):
@@ -298,6 +968,13 @@ class Property(Multiplicity, NamedElement):
         owner(Model): An ontological instance of the Model which designates
                         an owner of this property.
     '''
+    type = tracked_attribute('type')
+
+    # Owner model. Set in the constructor.
+    owner = weak_attribute('owner')
+
+    _cloned = ('_type', '_owner')
+
     def __init__(self, name, type, owner, **kwargs):  # @ReservedAssignment
         from morpy import Workspace
         super(Property, self).__init__(meta=Workspace().prop, name=name,
@@ -305,6 +982,25 @@ class Property(Multiplicity, NamedElement):
         self.type = type
         self.owner = owner
 
+        self._live = True
+        if replication.log is not None:
+            replication.log.created(self)
+        if index.name_index is not None:
+            index.name_index.add(self)
+
+    def _changed(self, attr):
+        super(Property, self)._changed(attr)
+        if self._live and self.owner is not None:
+            self.owner._meta_changed()
+
+    def _invalidate_hash(self):
+        if self.owner is not None:
+            self.owner._invalidate_hash()
+
+    def _hashed_state(self):
+        return (self.uuid, self.name, _ident(self.type), self.lower_bound,
+                self.upper_bound)
+
 
 class Reference(Multiplicity, NamedElement):
     '''
@@ -316,7 +1012,20 @@ class Reference(Multiplicity, NamedElement):
         containment(Boolean): Does this reference have a containment semantics.
         opposite(Model): The other side of the reference (for bidirectional
             references).
+
+    The type is referenced strongly. A reference typed by its owner model,
+    or by a model containing it, therefore forms a reference cycle which
+    is freed by the cyclic garbage collector.
     '''
+    type = tracked_attribute('type')
+    containment = tracked_attribute('containment')
+    opposite = tracked_attribute('opposite', weak=True)
+
+    # Owner model. Set in the constructor.
+    owner = weak_attribute('owner')
+
+    _cloned = ('_type', '_owner', '_containment', '_opposite')
+
     def __init__(self, name, type, owner, containment=False, opposite=None,  # @ReservedAssignment @IgnorePep8
                  **kwargs):  # @IgnorePep8
         from morpy import Workspace
@@ -326,28 +1035,86 @@ class Reference(Multiplicity, NamedElement):
         self.owner = owner
         self.containment = containment
         self.opposite = opposite
+
+        self._live = True
+        if replication.log is not None:
+            replication.log.created(self)
+        if index.name_index is not None:
+            index.name_index.add(self)
+
         if opposite:
             opposite.opposite = self
 
+    def _changed(self, attr):
+        super(Reference, self)._changed(attr)
+        if self._live and self.owner is not None:
+            self.owner._meta_changed()
+
+    def _invalidate_hash(self):
+        if self.owner is not None:
+            self.owner._invalidate_hash()
+
+    def _hashed_state(self):
+        return (self.uuid, self.name, _ident(self.type), self.containment,
+                _ident(self.opposite), self.lower_bound, self.upper_bound)
+
 
 class ModelInst(MoRPObject):
     '''
-    Instance of MoRP model.
+    Instance of MoRP model. Values of the model properties and references
+    are accessed as attributes by feature name. Unset features are None.
+    An instance is upgraded to the current meta version of its model on
+    the first access after the model changes (see morpy.migration).
     '''
 
-    def _by_name(self, name):
-        pass
+    def __init__(self, meta, values=None, uuid=None):
+        super(ModelInst, self).__init__(meta=meta, uuid=uuid)
+        self._version = meta.meta_version
+        self._values = {}
+        migration.track(self)
+        if values:
+            for name, value in values.items():
+                setattr(self, name, value)
+
+    @property
+    def values(self):
+        '''
+        Dict of set feature values by feature name.
+        '''
+        self._upgrade()
+        return dict(self._values)
+
+    def _upgrade(self):
+        if self._version != self._meta.meta_version:
+            migration.upgrade(self)
 
     def __getattr__(self, name):
         '''
         Get an attribute or reference by name.
         '''
-        return self._by_name(name)
+        if name.startswith('_'):
+            raise AttributeError(name)
+        self._upgrade()
+        values = self._values
+        if name in values:
+            return values[name]
+        if name in self._meta.features:
+            return None
+        raise AttributeError("Model '%s' has no feature '%s'." %
+                             (self._meta.name, name))
 
     def __setattr__(self, name, value):
         '''
+        Set an attribute or reference by name.
         '''
-#         self._by_name(name) = value
+        if name.startswith('_'):
+            object.__setattr__(self, name, value)
+            return
+        self._upgrade()
+        if name not in self._meta.features:
+            raise AttributeError("Model '%s' has no feature '%s'." %
+                                 (self._meta.name, name))
+        self._values[name] = value
 
 
 class ReferenceInst(MoRPObject):
@@ -396,6 +1163,30 @@ class Language(NamedElement):
                                       language=self, uuid=abssyn_uuid)
         self.concrete_syntaxes = []
         self.generators = []
+        self._live = True
+
+    def add_concrete_syntax(self, mogram):
+        '''
+        Adds the mogram as a concrete syntax of this language.
+        '''
+        self._add_mogram(mogram, self.concrete_syntaxes)
+
+    def add_generator(self, mogram):
+        '''
+        Adds the mogram as a generator configuration of this language.
+        '''
+        self._add_mogram(mogram, self.generators)
+
+    def _add_mogram(self, mogram, mograms):
+        from morpy import Workspace
+        catalog = Workspace().catalog
+        if mogram in catalog:
+            catalog.remove(mogram)
+        elif index.name_index is not None:
+            index.name_index.add_subtree(mogram)
+        mogram.language = self
+        mograms.append(mogram)
+        catalog.add(mogram)
 
 
 class Mogram(NamedElement, ModelContainer):
@@ -410,6 +1201,11 @@ class Mogram(NamedElement, ModelContainer):
             definition this reference will contain instance of containing
             Language.
     '''
+    conforms_to = tracked_attribute('conforms_to')
+    language = weak_attribute('language')
+
+    _cloned = ('_conforms_to', '_language')
+
     def __init__(self, name, conforms_to, language=None, **kwargs):
         from morpy import Workspace
         super(Mogram, self).__init__(name=name, meta=Workspace().model,
@@ -421,3 +1217,200 @@ class Mogram(NamedElement, ModelContainer):
         else:
             self.conforms_to = conforms_to
         self.language = language
+        self._live = True
+
+    def _set_name(self, name):
+        # Checked before the change is made and logged.
+        if self._live:
+            from morpy import Workspace
+            Workspace().catalog.check_name(self, name)
+        NamedElement.name.fset(self, name)
+
+    name = property(NamedElement.name.fget, _set_name)
+
+    def _changed(self, attr):
+        super(Mogram, self)._changed(attr)
+        if self._live:
+            from morpy import Workspace
+            Workspace().catalog.update(self)
+
+    def clone(self, name=None):
+        '''
+        Returns a copy of this mogram with all its models. See Model.clone.
+        The copy is not a part of any language definition.
+        Args:
+            name(string): Name of the copy. Defaults to the name of this
+                mogram.
+        '''
+        return _clone(self, name=name)
+
+    def _hashed_state(self):
+        return ('Mogram', self.uuid, self.name, _ident(self.conforms_to))
+
+
+def _clone(root, owner=None, name=None):
+    '''
+    Copies the containment subtree of the given model or mogram in a
+    single pass. Copies are created without calling constructors, by
+    copying instance attributes, and are registered in the workspace at
+    once. The cyclic garbage collector is paused meanwhile as copying
+    creates no garbage but many objects which would trigger collections.
+    '''
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _copy_subtree(root, owner, name)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+# Names of the instance attributes copied to clones by class.
+_cloned_by_class = {}
+
+
+def _cloned_attributes(cls):
+    '''
+    Returns names of the instance attributes copied to clones of instances
+    of the given class, i.e. `_cloned` of the class and its bases, and a
+    getter of their values.
+    '''
+    names = _cloned_by_class.get(cls)
+    if names is None:
+        names = []
+        for klass in reversed(cls.__mro__):
+            for name in klass.__dict__.get('_cloned', ()):
+                if name not in names:
+                    names.append(name)
+        names = _cloned_by_class[cls] = (tuple(names), attrgetter(*names))
+    return names
+
+
+def _copy_subtree(root, owner, name):
+    from morpy import Workspace
+
+    ref = weakref.ref
+    new = object.__new__
+    missing = object()
+    copies = {}
+    # All copies in containment pre-order.
+    clones = []
+    # Copied models with features, super models or inheriting models,
+    # rewired once all copies exist.
+    deferred = []
+
+    # Attributes are copied one by one as reading __dict__ of originals
+    # would slow down their attribute access (see tracked_attribute).
+    def copy(obj):
+        cls = type(obj)
+        clone = new(cls)
+        names, getter = _cloned_attributes(cls)
+        try:
+            values = getter(obj)
+        except AttributeError:
+            values = [getattr(obj, attr, missing) for attr in names]
+        for attr, value in zip(names, values):
+            if value is not missing:
+                setattr(clone, attr, value)
+        copies[id(obj)] = clone
+        clones.append(clone)
+        return clone
+
+    # Owners and contents are rewired while copying as owners are copied
+    # before the models they contain.
+    stack = [(root, None, None)]
+    while stack:
+        obj, owner_ref, siblings = stack.pop()
+        clone = copy(obj)
+        if siblings is not None:
+            clone._owner = owner_ref
+            siblings[clone] = None
+        # Containers are created and tested through their items as this
+        # loop runs once per model.
+        contents = clone.contents = new(MoRPContainer)
+        items = contents._items = {}
+        inner = obj.contents._items
+        if inner:
+            clone_ref = ref(clone)
+            stack.extend((m, clone_ref, items) for m in reversed(inner))
+        if not isinstance(obj, Model):
+            continue
+        if obj.properties or obj.references or \
+                obj.super_models._items or obj.inherited_models._items:
+            for feature in obj.properties:
+                copy(feature)
+            for feature in obj.references:
+                copy(feature)
+            deferred.append((obj, clone))
+        else:
+            clone.properties = []
+            clone.references = []
+            super_models = clone.super_models = new(MoRPContainer)
+            super_models._items = {}
+            inherited = clone.inherited_models = new(WeakMoRPContainer)
+            inherited._items = {}
+
+    for clone, uuid in zip(clones, _uuids(len(clones))):
+        clone._uuid = uuid
+
+    # Rewire references between copies. References to objects outside of
+    # the subtree are kept except opposites, which are cleared.
+    for obj, clone in deferred:
+        owner_ref = ref(clone)
+
+        properties = [copies[id(p)] for p in obj.properties]
+        for prop in properties:
+            prop._owner = owner_ref
+            type_ = prop._type
+            if id(type_) in copies:
+                prop._type = copies[id(type_)]
+        clone.properties = properties
+
+        references = [copies[id(r)] for r in obj.references]
+        for reference in references:
+            reference._owner = owner_ref
+            type_ = reference._type
+            if id(type_) in copies:
+                reference._type = copies[id(type_)]
+            opposite = reference.opposite
+            if id(opposite) in copies:
+                reference._opposite = ref(copies[id(opposite)])
+            elif opposite is not None:
+                # The opposite outside of the subtree stays paired with the
+                # original.
+                reference._opposite = None
+        clone.references = references
+
+        super_models = []
+        for super_model in obj.super_models:
+            if id(super_model) in copies:
+                super_model = copies[id(super_model)]
+            else:
+                super_model.inherited_models.append(clone)
+            super_models.append(super_model)
+        clone.super_models = MoRPContainer(super_models)
+        clone.inherited_models = WeakMoRPContainer(
+            [copies[id(m)] for m in obj.inherited_models if id(m) in copies])
+
+    clone = copies[id(root)]
+    if isinstance(root, Mogram):
+        clone._language = None
+        if name is not None:
+            clone._name = name
+    else:
+        clone._owner = None if owner is None else ref(owner)
+        if owner is not None:
+            owner.contents.append(clone)
+            owner._invalidate_hash()
+
+    Workspace().by_uuid.update((c._uuid, c) for c in clones)
+    if stats.collector is not None:
+        for c in clones:
+            stats.collector.record_created(c)
+    if replication.log is not None:
+        replication.log.cloned(clones)
+    if index.name_index is not None:
+        if not isinstance(clone, Mogram):
+            index.name_index.add(clone)
+        index.name_index.add_subtree(clone)
+    return clone
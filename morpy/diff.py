@@ -0,0 +1,446 @@
+#-*- coding: utf-8 -*-
+#######################################################################
+# Name: diff.py
+# Purpose: Structural diff and three-way merge of mograms
+# Author: Igor R. Dejanovic <igor DOT dejanovic AT gmail DOT com>
+# Copyright: (c) 2013 Igor R. Dejanovic <igor DOT dejanovic AT gmail DOT com>
+# License: MIT License
+#######################################################################
+'''
+Elements (models, properties and references) of two versions of a mogram
+are matched by UUID. Both containment trees are walked in parallel and
+subtrees with equal content hashes are skipped, so when the hashes are
+already calculated (see ModelContainer.content_hash) diff time is
+proportional to the size of the change and not to the size of the mogram.
+'''
+from morpy.core import Model, Property, _ident
+
+# Change kinds
+ADDED = 'added'
+REMOVED = 'removed'
+MOVED = 'moved'
+RENAMED = 'renamed'
+RETYPED = 'retyped'
+CHANGED = 'changed'
+
+# Compared aspects of each kind of element. Containment is reported under
+# the 'owner' aspect.
+MODEL_ASPECTS = ('name', 'abstract', 'super_models')
+PROPERTY_ASPECTS = ('name', 'type', 'lower_bound', 'upper_bound')
+REFERENCE_ASPECTS = ('name', 'type', 'containment', 'opposite',
+                     'lower_bound', 'upper_bound')
+
+
+def _aspects(element):
+    if isinstance(element, Model):
+        return MODEL_ASPECTS
+    elif isinstance(element, Property):
+        return PROPERTY_ASPECTS
+    else:
+        return REFERENCE_ASPECTS
+
+
+def _value(element, aspect):
+    '''
+    Returns comparable value of the element aspect. References to other
+    objects are given by their UUIDs.
+    '''
+    if aspect == 'super_models':
+        return tuple(m.uuid for m in element.super_models)
+    value = getattr(element, aspect)
+    if aspect in ('type', 'opposite'):
+        return _ident(value)
+    return value
+
+
+class Change(object):
+    '''
+    A single difference between two versions.
+
+    Attributes:
+        kind(string): One of ADDED, REMOVED, MOVED, RENAMED, RETYPED,
+            CHANGED.
+        element(MoRPObject): Changed element. For REMOVED it is the element
+            from the old version, otherwise from the new version.
+        aspect(string): Changed aspect ('owner' for ADDED, REMOVED and
+            MOVED).
+        old: The old value of the aspect.
+        new: The new value of the aspect.
+    Owners and references to other objects are given by UUIDs. Owner of
+    top-level models is None.
+    '''
+    def __init__(self, kind, element, aspect, old, new):
+        self.kind = kind
+        self.element = element
+        self.aspect = aspect
+        self.old = old
+        self.new = new
+
+    @property
+    def uuid(self):
+        return self.element.uuid
+
+    def __repr__(self):
+        return "<%s %s %s: %r -> %r>" % (self.kind, self.element,
+                                          self.aspect, self.old, self.new)
+
+
+class Conflict(object):
+    '''
+    Changes made in both versions that can't be merged.
+
+    Attributes:
+        ours(Change): Change in our version. None if their change refers to
+            an element that is missing in our version for other reasons,
+            e.g. an element added in their version in conflict.
+        theirs(Change): Change in their version that was not applied.
+    '''
+    def __init__(self, ours, theirs):
+        self.ours = ours
+        self.theirs = theirs
+
+    def __repr__(self):
+        return "<conflict ours=%r theirs=%r>" % (self.ours, self.theirs)
+
+
+class _Differ(object):
+
+    def __init__(self, old_root, new_root):
+        self.old_root = old_root
+        self.new_root = new_root
+        self.changes = []
+        # Elements present only in one of the subtrees compared in parallel.
+        # Matched afterwards by UUID to find moved elements.
+        self.added = {}
+        self.removed = {}
+
+    def run(self):
+        if isinstance(self.old_root, Model):
+            self._compare(self.old_root, self.new_root)
+        elif self.old_root.content_hash != self.new_root.content_hash:
+            self._compare_contents(self.old_root, self.new_root)
+
+        changes = self.changes
+        removed = self.removed
+        for uuid, new in self.added.items():
+            new_owner = self._owner(new, self.new_root)
+            old = removed.pop(uuid, None)
+            if old is None:
+                changes.append(Change(ADDED, new, 'owner', None, new_owner))
+            else:
+                old_owner = self._owner(old, self.old_root)
+                if old_owner != new_owner:
+                    changes.append(Change(MOVED, new, 'owner', old_owner,
+                                          new_owner))
+                self._compare_aspects(old, new)
+        for old in removed.values():
+            changes.append(Change(REMOVED, old, 'owner',
+                                  self._owner(old, self.old_root), None))
+        return changes
+
+    @staticmethod
+    def _owner(element, root):
+        owner = element.owner
+        return None if owner is root else owner.uuid
+
+    def _compare(self, old, new):
+        if old.content_hash == new.content_hash:
+            return
+        self._compare_aspects(old, new)
+        self._compare_features(old.properties, new.properties)
+        self._compare_features(old.references, new.references)
+        self._compare_contents(old, new)
+
+    def _compare_aspects(self, old, new):
+        for aspect in _aspects(new):
+            old_value = _value(old, aspect)
+            new_value = _value(new, aspect)
+            if old_value != new_value:
+                if aspect == 'name':
+                    kind = RENAMED
+                elif aspect == 'type':
+                    kind = RETYPED
+                else:
+                    kind = CHANGED
+                self.changes.append(Change(kind, new, aspect, old_value,
+                                           new_value))
+
+    def _compare_features(self, old_features, new_features):
+        old_by_uuid = dict((f.uuid, f) for f in old_features)
+        for new in new_features:
+            old = old_by_uuid.pop(new.uuid, None)
+            if old is None:
+                self.added[new.uuid] = new
+            else:
+                self._compare_aspects(old, new)
+        for old in old_by_uuid.values():
+            self.removed[old.uuid] = old
+
+    def _compare_contents(self, old_container, new_container):
+        old_by_uuid = dict((m.uuid, m) for m in old_container.contents)
+        for new in new_container.contents:
+            old = old_by_uuid.pop(new.uuid, None)
+            if old is None:
+                self._register(self.added, new)
+            else:
+                self._compare(old, new)
+        for old in old_by_uuid.values():
+            self._register(self.removed, old)
+
+    def _register(self, registry, model):
+        '''
+        Registers the model subtree in pre-order, as its parts might have
+        been moved.
+        '''
+        registry[model.uuid] = model
+        for feature in model.properties:
+            registry[feature.uuid] = feature
+        for feature in model.references:
+            registry[feature.uuid] = feature
+        for inner in model.contents:
+            self._register(registry, inner)
+
+
+def diff(old, new):
+    '''
+    Returns a list of changes needed to get from the old to the new version.
+    Args:
+        old, new(Mogram or Model): Versions to compare. The roots themselves
+            are matched regardless of their UUIDs.
+    '''
+    return _Differ(old, new).run()
+
+
+def merge(base, ours, theirs):
+    '''
+    Three-way merge. Changes made in `theirs` relative to `base` that do
+    not conflict with changes in `ours` are applied to `ours` in place.
+    Versions may share UUIDs in one workspace. Elements added to `ours` do
+    not replace elements of the other versions in the workspace registry.
+    Args:
+        base, ours, theirs(Mogram or Model): The common ancestor and two
+            changed versions.
+    Returns:
+        A list of Conflict instances for changes that were not applied,
+        including their changes referring to elements missing in `ours`.
+    '''
+    our_changes = diff(base, ours)
+    their_changes = diff(base, theirs)
+
+    ours_by_key = dict(((c.uuid, c.aspect), c) for c in our_changes)
+    ours_removed = dict((c.uuid, c) for c in our_changes if c.kind == REMOVED)
+    ours_changed = dict((c.uuid, c) for c in our_changes)
+    # Changes placing elements into owners.
+    ours_placed = dict((c.new, c) for c in our_changes
+                       if c.kind in (ADDED, MOVED))
+
+    conflicts = []
+    to_apply = []
+    for change in their_changes:
+        our_change = ours_by_key.get((change.uuid, change.aspect))
+        if our_change is not None:
+            if our_change.kind != change.kind or our_change.new != change.new:
+                conflicts.append(Conflict(our_change, change))
+            continue
+        if change.uuid in ours_removed:
+            # Modified in theirs, removed in ours.
+            conflicts.append(Conflict(ours_removed[change.uuid], change))
+        elif change.kind == REMOVED and (change.uuid in ours_changed
+                                         or change.uuid in ours_placed):
+            # Removed in theirs, modified in ours.
+            conflicts.append(Conflict(ours_changed.get(change.uuid)
+                                      or ours_placed[change.uuid], change))
+        elif change.kind in (ADDED, MOVED) and change.new in ours_removed:
+            # Placed in theirs into an element removed in ours.
+            conflicts.append(Conflict(ours_removed[change.new], change))
+        else:
+            to_apply.append(change)
+
+    for change in apply_changes(ours, to_apply, versions=(base, theirs)):
+        # Refers to an element missing in ours. Our change of it, if any,
+        # is the cause.
+        referred = [c for c in our_changes
+                    if c.kind == REMOVED and c.uuid in _referred(change)]
+        conflicts.append(Conflict(referred[0] if referred else None, change))
+    return conflicts
+
+
+def _referred(change):
+    '''
+    Returns UUIDs of the elements the change refers to.
+    '''
+    element = change.element
+    uuids = set([change.uuid, change.new])
+    if change.aspect == 'super_models':
+        uuids.update(change.new)
+    elif change.kind == ADDED:
+        if isinstance(element, Model):
+            uuids.update(m.uuid for m in element.super_models)
+        else:
+            uuids.add(_ident(element.type))
+            uuids.add(_ident(getattr(element, 'opposite', None)))
+    return uuids
+
+
+def _index(root):
+    index = {}
+    stack = list(root.contents)
+    if isinstance(root, Model):
+        stack.append(root)
+    while stack:
+        model = stack.pop()
+        index[model.uuid] = model
+        for feature in model.properties:
+            index[feature.uuid] = feature
+        for feature in model.references:
+            index[feature.uuid] = feature
+        stack.extend(model.contents)
+    return index
+
+
+def apply_changes(root, changes, versions=()):
+    '''
+    Applies changes, e.g. returned by diff, to the given mogram or model.
+    Elements are resolved by UUID inside the root and then in the
+    workspace. Added elements whose UUIDs belong to live objects, e.g. of
+    another version in this workspace, are not registered in the
+    workspace, so the registry keeps returning the existing objects.
+    Args:
+        root(Mogram or Model):
+        changes(list of Change):
+        versions(list of Mogram or Model): Other versions of the root, e.g.
+            the base and their version of a merge. Their elements are
+            resolved only inside the root.
+    Returns:
+        A list of changes that were not applied, or were applied only in
+        part, as they refer to elements of the versions missing in the root.
+    '''
+    from morpy import Workspace
+    registry = Workspace().by_uuid
+    index = _index(root)
+    foreign = set()
+    for version in versions:
+        foreign.update(_index(version))
+    skipped = []
+
+    def resolve(value):
+        if value in index:
+            return index[value]
+        if value in foreign:
+            raise KeyError(value)
+        return registry.get(value, value)
+
+    def resolve_owner(uuid):
+        return root if uuid is None else index[uuid]
+
+    added = [c for c in changes if c.kind == ADDED]
+    removed = [c for c in changes if c.kind == REMOVED]
+    moved = [c for c in changes if c.kind == MOVED]
+    modified = [c for c in changes if c.kind not in (ADDED, REMOVED, MOVED)]
+
+    # Added elements are given in pre-order so owners are created first.
+    # Types and other references to elements are resolved when all are
+    # created, as they may refer to elements added later.
+    created = []
+    for change in added:
+        element = change.element
+        existing = registry.get(element.uuid)
+        try:
+            owner = resolve_owner(change.new)
+        except KeyError:
+            skipped.append(change)
+            continue
+        if isinstance(element, Model):
+            new = Model(element.name, owner=owner, abstract=element.abstract,
+                        uuid=element.uuid)
+        elif isinstance(element, Property):
+            new = owner.create_property(element.name, None,
+                                        lower_bound=element.lower_bound,
+                                        upper_bound=element.upper_bound,
+                                        uuid=element.uuid)
+        else:
+            new = owner.create_reference(element.name, None,
+                                         containment=element.containment,
+                                         lower_bound=element.lower_bound,
+                                         upper_bound=element.upper_bound,
+                                         uuid=element.uuid)
+        if existing is not None:
+            registry[element.uuid] = existing
+        index[element.uuid] = new
+        created.append(change)
+
+    for change in created:
+        element = change.element
+        new = index[element.uuid]
+        if isinstance(element, Model):
+            try:
+                for super_model in element.super_models:
+                    new.add_super_model(resolve(super_model.uuid))
+            except KeyError:
+                skipped.append(change)
+            continue
+        try:
+            new.type = resolve(_ident(element.type))
+        except KeyError:
+            # Features are not created without their types.
+            index.pop(element.uuid)
+            if isinstance(element, Property):
+                new.owner.remove_property(new)
+            else:
+                new.owner.remove_reference(new)
+            skipped.append(change)
+            continue
+        if not isinstance(element, Property) and element.opposite:
+            try:
+                new.opposite = resolve(_ident(element.opposite))
+            except KeyError:
+                skipped.append(change)
+
+    for change in moved:
+        try:
+            element = index[change.uuid]
+            owner = resolve_owner(change.new)
+        except KeyError:
+            skipped.append(change)
+            continue
+        if isinstance(element, Model):
+            owner.add_model(element)
+        elif isinstance(element, Property):
+            owner.add_property(element)
+        else:
+            owner.add_reference(element)
+
+    for change in modified:
+        try:
+            element = index[change.uuid]
+            if change.aspect == 'super_models':
+                target = [resolve(uuid) for uuid in change.new]
+            elif change.aspect in ('type', 'opposite'):
+                value = resolve(change.new)
+        except KeyError:
+            skipped.append(change)
+            continue
+        if change.aspect == 'super_models':
+            for super_model in list(element.super_models):
+                if super_model not in target:
+                    element.remove_super_model(super_model)
+            for super_model in target:
+                if super_model not in element.super_models:
+                    element.add_super_model(super_model)
+        elif change.aspect in ('type', 'opposite'):
+            setattr(element, change.aspect, value)
+        else:
+            setattr(element, change.aspect, change.new)
+
+    # Inner elements are removed first.
+    for change in reversed(removed):
+        element = index.pop(change.uuid, None)
+        if element is None or element.owner is None:
+            continue
+        if isinstance(element, Model):
+            element.owner.remove_model(element)
+        elif isinstance(element, Property):
+            element.owner.remove_property(element)
+        else:
+            element.owner.remove_reference(element)
+    return skipped
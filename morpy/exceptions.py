@@ -40,3 +40,48 @@ class MogramExists(MoRPyException):
     def __init__(self, name):
         super(MogramExists, self).__init__(\
                     "Mogram with the name '%s' is already registered." % name)
+
+
+class DuplicateGenerator(MoRPyException):
+    '''
+    Raised if generator configurations of a language run together have
+    the same name, as their outputs are keyed by it.
+    '''
+    def __init__(self, name):
+        super(DuplicateGenerator, self).__init__(\
+                    "Generator configuration '%s' is not unique." % name)
+
+
+class QuerySyntaxError(MoRPyException):
+    '''
+    Raised if a path query can't be parsed.
+    '''
+    def __init__(self, query, position, message):
+        self.query = query
+        self.position = position
+        super(QuerySyntaxError, self).__init__(\
+                    "Invalid query '%s' at position %d: %s" %
+                    (query, position, message))
+
+
+class AbstractInstantiation(MoRPyException):
+    '''
+    Raised if caller tries to create an instance of an abstract model.
+    '''
+    def __init__(self, name):
+        super(AbstractInstantiation, self).__init__(\
+                    "Model '%s' is abstract and can't be instantiated." % name)
+
+
+class ReplicationError(MoRPyException):
+    '''
+    Raised if a replicated operation refers to an object that does not
+    exist in the workspace.
+    '''
+    def __init__(self, seq, op, uuid):
+        self.seq = seq
+        self.op = op
+        self.uuid = uuid
+        super(ReplicationError, self).__init__(\
+                    "Operation %d (%s) refers to unknown object '%s'." %
+                    (seq, op, uuid))
@@ -0,0 +1,595 @@
+#-*- coding: utf-8 -*-
+#######################################################################
+# Name: frozen.py
+# Purpose: Read-only shared memory encoding of mograms
+# Author: Igor R. Dejanovic <igor DOT dejanovic AT gmail DOT com>
+# Copyright: (c) 2013 Igor R. Dejanovic <igor DOT dejanovic AT gmail DOT com>
+# License: MIT License
+#######################################################################
+'''
+Frozen mograms are compact read-only encodings of a mogram (or a model
+subtree) placed in a multiprocessing.shared_memory block. Other processes
+attach to the block by its name and navigate it in place, without
+copying or unpickling:
+
+    frozen = freeze(mogram)
+    # In a worker process:
+    with FrozenMogram.attach(frozen.name) as mogram:
+        person = mogram.by_name('Person')
+        names = [p.name for p in person.properties]
+
+The creator must keep the returned FrozenMogram until workers are done and
+then call unlink().
+
+Encoding is a sequence of int32 arrays followed by UTF-8 string data:
+
+    header       MAGIC, VERSION and section sizes
+    strings      offsets of strings in the string data
+    nodes        models in breadth-first order so inner models of each
+                 model are contiguous. Node 0 is the frozen container.
+    properties   properties, contiguous per model
+    references   references, contiguous per model
+    supers       super models, contiguous per model
+    externals    UUIDs and names of referenced objects outside of the
+                 frozen container
+    uuid index   nodes sorted by UUID
+    name index   nodes sorted by name and depth-first order
+
+Nodes also store their depth-first (pre-order) rank and subtree size so a
+subtree is a contiguous range of ranks. by_name and by_uuid are binary
+searches. References to objects are encoded as non-negative indexes of
+frozen objects, -1 for None, and -2 - i for the i-th external object.
+'''
+from array import array
+from bisect import bisect_left
+from multiprocessing import shared_memory
+
+from morpy.core import Model
+
+MAGIC = 0x4d6f5250
+VERSION = 1
+
+# Header fields.
+HEADER = ('magic', 'version', 'nodes', 'properties', 'references',
+          'supers', 'externals', 'strings', 'data')
+
+# Node fields.
+(N_UUID, N_NAME, N_OWNER, N_ABSTRACT, N_FIRST_CHILD, N_CHILDREN,
+ N_FIRST_PROPERTY, N_PROPERTIES, N_FIRST_REFERENCE, N_REFERENCES,
+ N_FIRST_SUPER, N_SUPERS, N_RANK, N_SIZE) = range(14)
+NODE_FIELDS = 14
+
+# Property fields.
+P_UUID, P_NAME, P_OWNER, P_TYPE, P_LOWER, P_UPPER = range(6)
+PROPERTY_FIELDS = 6
+
+# Reference fields.
+(R_UUID, R_NAME, R_OWNER, R_TYPE, R_LOWER, R_UPPER, R_CONTAINMENT,
+ R_OPPOSITE) = range(8)
+REFERENCE_FIELDS = 8
+
+# External object fields.
+E_UUID, E_NAME = range(2)
+EXTERNAL_FIELDS = 2
+
+ITEM_SIZE = array('i').itemsize
+
+
+class _Encoder(object):
+    '''
+    Builds the encoding of a container.
+    '''
+    def __init__(self):
+        self.strings = {}
+        self.string_list = []
+        self.externals = {}
+        self.external_list = []
+
+    def string(self, value):
+        index = self.strings.get(value)
+        if index is None:
+            index = self.strings[value] = len(self.string_list)
+            self.string_list.append(value.encode('utf-8'))
+        return index
+
+    def external(self, obj):
+        index = self.externals.get(obj.uuid)
+        if index is None:
+            index = self.externals[obj.uuid] = len(self.external_list)
+            self.external_list.append(
+                (self.string(obj.uuid),
+                 self.string(getattr(obj, 'name', None) or '')))
+        return -2 - index
+
+    def target(self, obj, indexes):
+        if obj is None:
+            return -1
+        index = indexes.get(id(obj))
+        if index is not None:
+            return index
+        return self.external(obj)
+
+    def encode(self, root):
+        # Number models breadth-first.
+        nodes = [root]
+        node_indexes = {id(root): 0}
+        for node in nodes:
+            for model in node.contents:
+                node_indexes[id(model)] = len(nodes)
+                nodes.append(model)
+
+        # Depth-first ranks and subtree sizes.
+        ranks = [0] * len(nodes)
+        sizes = [1] * len(nodes)
+        rank = 0
+        stack = [(root, False)]
+        while stack:
+            node, done = stack.pop()
+            index = node_indexes[id(node)]
+            if done:
+                for model in node.contents:
+                    sizes[index] += sizes[node_indexes[id(model)]]
+                continue
+            ranks[index] = rank
+            rank += 1
+            stack.append((node, True))
+            stack.extend((m, False) for m in reversed(node.contents))
+
+        properties = []
+        references = []
+        for node in nodes:
+            if isinstance(node, Model):
+                properties.extend(node.properties)
+                references.extend(node.references)
+        feature_indexes = dict((id(r), i) for i, r in enumerate(references))
+
+        node_data = array('i')
+        property_data = array('i')
+        reference_data = array('i')
+        super_data = array('i')
+        first_child = 1
+        for index, node in enumerate(nodes):
+            is_model = isinstance(node, Model)
+            owner = node.owner if is_model else None
+            node_properties = node.properties if is_model else ()
+            node_references = node.references if is_model else ()
+            super_models = node.super_models if is_model else ()
+            node_data.extend([
+                self.string(node.uuid), self.string(node.name),
+                node_indexes.get(id(owner), -1) if index else -1,
+                1 if is_model and node.abstract else 0,
+                first_child, len(node.contents),
+                len(property_data) // PROPERTY_FIELDS, len(node_properties),
+                len(reference_data) // REFERENCE_FIELDS,
+                len(node_references),
+                len(super_data), len(super_models),
+                ranks[index], sizes[index]])
+            first_child += len(node.contents)
+            for prop in node_properties:
+                property_data.extend([
+                    self.string(prop.uuid), self.string(prop.name), index,
+                    self.target(prop.type, node_indexes), prop.lower_bound,
+                    prop.upper_bound])
+            for reference in node_references:
+                reference_data.extend([
+                    self.string(reference.uuid), self.string(reference.name),
+                    index, self.target(reference.type, node_indexes),
+                    reference.lower_bound, reference.upper_bound,
+                    1 if reference.containment else 0,
+                    self.target(reference.opposite, feature_indexes)])
+            for super_model in super_models:
+                super_data.append(self.target(super_model, node_indexes))
+
+        string_list = self.string_list
+        uuid_index = array('i', sorted(
+            range(len(nodes)), key=lambda i: string_list[node_data[
+                i * NODE_FIELDS + N_UUID]]))
+        name_index = array('i', sorted(
+            range(len(nodes)), key=lambda i: (
+                string_list[node_data[i * NODE_FIELDS + N_NAME]],
+                ranks[i])))
+
+        offsets = array('i', [0])
+        for value in string_list:
+            offsets.append(offsets[-1] + len(value))
+        external_data = array('i')
+        for external in self.external_list:
+            external_data.extend(external)
+
+        header = array('i', [
+            MAGIC, VERSION, len(nodes), len(properties), len(references),
+            len(super_data), len(self.external_list), len(string_list),
+            offsets[-1]])
+        sections = [header, offsets, node_data, property_data,
+                    reference_data, super_data, external_data, uuid_index,
+                    name_index]
+        return sections, b''.join(string_list)
+
+
+def freeze(container, name=None):
+    '''
+    Encodes the given mogram or model with all its inner models into a new
+    shared memory block.
+    Args:
+        container(Mogram or Model): Container to freeze.
+        name(string): Name of the shared memory block. Generated if not
+            given.
+    Returns:
+        FrozenMogram owning the shared memory block. Call unlink() when the
+        block is no longer needed.
+    '''
+    sections, data = _Encoder().encode(container)
+    size = sum(len(s) for s in sections) * ITEM_SIZE + len(data)
+    shm = shared_memory.SharedMemory(name=name, create=True,
+                                     size=max(size, 1))
+    offset = 0
+    for section in sections:
+        raw = section.tobytes()
+        shm.buf[offset:offset + len(raw)] = raw
+        offset += len(raw)
+    shm.buf[offset:offset + len(data)] = data
+    return FrozenMogram(shm)
+
+
+class FrozenMogram(object):
+    '''
+    Read-only view of a frozen mogram in shared memory. Mirrors the
+    querying API of the frozen container.
+    '''
+    def __init__(self, shm):
+        self._shm = shm
+        header = array('i')
+        header.frombytes(shm.buf[:len(HEADER) * ITEM_SIZE])
+        header = dict(zip(HEADER, header))
+        if header['magic'] != MAGIC or header['version'] != VERSION:
+            raise ValueError("Shared memory block '%s' is not a frozen "
+                             "mogram." % shm.name)
+        sections = (
+            ('_offsets', header['strings'] + 1),
+            ('_nodes', header['nodes'] * NODE_FIELDS),
+            ('_properties', header['properties'] * PROPERTY_FIELDS),
+            ('_references', header['references'] * REFERENCE_FIELDS),
+            ('_supers', header['supers']),
+            ('_externals', header['externals'] * EXTERNAL_FIELDS),
+            ('_uuid_index', header['nodes']),
+            ('_name_index', header['nodes']))
+        offset = len(HEADER)
+        raw = shm.buf[:(offset + sum(s[1] for s in sections)) * ITEM_SIZE]
+        ints = raw.cast('i')
+        self._views = [raw, ints]
+        for attr, length in sections:
+            view = ints[offset:offset + length]
+            self._views.append(view)
+            setattr(self, attr, view)
+            offset += length
+        data_start = offset * ITEM_SIZE
+        self._data = shm.buf[data_start:data_start + header['data']]
+        self._views.append(self._data)
+        self.root = FrozenModel(self, 0)
+
+    @classmethod
+    def attach(cls, name):
+        '''
+        Attaches to the frozen mogram in the shared memory block with the
+        given name.
+        '''
+        try:
+            # The block is owned by its creator.
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            shm = shared_memory.SharedMemory(name=name)
+        return cls(shm)
+
+    @property
+    def name(self):
+        '''
+        Name of the shared memory block.
+        '''
+        return self._shm.name
+
+    @property
+    def size(self):
+        return self._shm.size
+
+    def close(self):
+        '''
+        Detaches from the shared memory block. Frozen objects obtained
+        from this instance must not be used afterwards.
+        '''
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._shm.close()
+
+    def unlink(self):
+        '''
+        Closes and destroys the shared memory block. Called by the creator.
+        '''
+        self.close()
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # Querying API of the frozen container.
+    @property
+    def uuid(self):
+        return self.root.uuid
+
+    @property
+    def contents(self):
+        return self.root.contents
+
+    def by_name(self, name):
+        return self.root.by_name(name)
+
+    def by_uuid(self, uuid):
+        return self.root.by_uuid(uuid)
+
+    def __iter__(self):
+        return iter(self.root.contents)
+
+    def __len__(self):
+        '''
+        Number of frozen models.
+        '''
+        return len(self._nodes) // NODE_FIELDS - 1
+
+    def _string(self, index):
+        return self._bytes(index).decode('utf-8')
+
+    def _bytes(self, index):
+        offsets = self._offsets
+        return bytes(self._data[offsets[index]:offsets[index + 1]])
+
+    def _target(self, value, cls):
+        if value == -1:
+            return None
+        if value >= 0:
+            return cls(self, value)
+        base = (-2 - value) * EXTERNAL_FIELDS
+        externals = self._externals
+        return FrozenExternal(self._string(externals[base + E_UUID]),
+                              self._string(externals[base + E_NAME]))
+
+    def _node_field(self, node, field):
+        return self._nodes[node * NODE_FIELDS + field]
+
+    def _search(self, index, key, low, high):
+        '''
+        Returns position of the first entry of the sorted index not less
+        than the key.
+        '''
+        return bisect_left(_IndexKeys(self, index), key, low, high)
+
+
+class _IndexKeys(object):
+    '''
+    Sequence of sort keys of a node index for binary search.
+    '''
+    def __init__(self, frozen, index):
+        self.frozen = frozen
+        self.index = index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, position):
+        frozen = self.frozen
+        node = self.index[position]
+        if self.index is frozen._uuid_index:
+            return frozen._bytes(frozen._node_field(node, N_UUID))
+        return (frozen._bytes(frozen._node_field(node, N_NAME)),
+                frozen._node_field(node, N_RANK))
+
+
+class FrozenExternal(object):
+    '''
+    Object outside of the frozen container, e.g. a primitive type.
+    '''
+    def __init__(self, uuid, name):
+        self.uuid = uuid
+        self.name = name
+
+    def __eq__(self, other):
+        return isinstance(other, FrozenExternal) and other.uuid == self.uuid
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.uuid)
+
+    def __repr__(self):
+        return '{external %s(%s)}' % (self.name, self.uuid)
+
+
+class _FrozenObject(object):
+    '''
+    Base for objects read from a frozen mogram.
+    '''
+    _fields = None
+    _field_count = None
+
+    def __init__(self, frozen, index):
+        self._frozen = frozen
+        self._index = index
+
+    def _field(self, field):
+        return getattr(self._frozen, self._fields)[
+            self._index * self._field_count + field]
+
+    def __eq__(self, other):
+        return type(other) is type(self) and \
+            other._frozen is self._frozen and other._index == self._index
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self._frozen), self._index))
+
+    def __repr__(self):
+        return '{frozen %s(%s)}' % (self.name, self.uuid)
+
+
+class FrozenModel(_FrozenObject):
+    '''
+    Read-only model (or the frozen container itself for index 0).
+    '''
+    _fields = '_nodes'
+    _field_count = NODE_FIELDS
+
+    @property
+    def uuid(self):
+        return self._frozen._string(self._field(N_UUID))
+
+    @property
+    def name(self):
+        return self._frozen._string(self._field(N_NAME))
+
+    @property
+    def abstract(self):
+        return bool(self._field(N_ABSTRACT))
+
+    @property
+    def owner(self):
+        return self._frozen._target(self._field(N_OWNER), FrozenModel)
+
+    @property
+    def contents(self):
+        first = self._field(N_FIRST_CHILD)
+        return [FrozenModel(self._frozen, i)
+                for i in range(first, first + self._field(N_CHILDREN))]
+
+    @property
+    def properties(self):
+        first = self._field(N_FIRST_PROPERTY)
+        return [FrozenProperty(self._frozen, i)
+                for i in range(first, first + self._field(N_PROPERTIES))]
+
+    @property
+    def references(self):
+        first = self._field(N_FIRST_REFERENCE)
+        return [FrozenReference(self._frozen, i)
+                for i in range(first, first + self._field(N_REFERENCES))]
+
+    @property
+    def super_models(self):
+        frozen = self._frozen
+        first = self._field(N_FIRST_SUPER)
+        return [frozen._target(frozen._supers[i], FrozenModel)
+                for i in range(first, first + self._field(N_SUPERS))]
+
+    def by_name(self, name):
+        '''
+        Returns the first inner model with the given name in depth-first
+        order, as Model.by_name does.
+        '''
+        frozen = self._frozen
+        rank = self._field(N_RANK)
+        key = (name.encode('utf-8'), rank + 1)
+        position = frozen._search(frozen._name_index, key, 0,
+                                  len(frozen._name_index))
+        if position < len(frozen._name_index):
+            node = frozen._name_index[position]
+            if frozen._bytes(frozen._node_field(node, N_NAME)) == key[0] \
+                    and frozen._node_field(node, N_RANK) < \
+                    rank + self._field(N_SIZE):
+                return FrozenModel(frozen, node)
+        return None
+
+    def by_uuid(self, uuid):
+        '''
+        Returns the inner model with the given UUID.
+        '''
+        frozen = self._frozen
+        key = uuid.encode('utf-8')
+        position = frozen._search(frozen._uuid_index, key, 0,
+                                  len(frozen._uuid_index))
+        if position < len(frozen._uuid_index):
+            node = frozen._uuid_index[position]
+            rank = frozen._node_field(node, N_RANK)
+            if frozen._bytes(frozen._node_field(node, N_UUID)) == key and \
+                    self._field(N_RANK) < rank < \
+                    self._field(N_RANK) + self._field(N_SIZE):
+                return FrozenModel(frozen, node)
+        return None
+
+    def __iter__(self):
+        return iter(self.contents)
+
+
+class FrozenProperty(_FrozenObject):
+    '''
+    Read-only property.
+    '''
+    _fields = '_properties'
+    _field_count = PROPERTY_FIELDS
+
+    @property
+    def uuid(self):
+        return self._frozen._string(self._field(P_UUID))
+
+    @property
+    def name(self):
+        return self._frozen._string(self._field(P_NAME))
+
+    @property
+    def owner(self):
+        return FrozenModel(self._frozen, self._field(P_OWNER))
+
+    @property
+    def type(self):
+        return self._frozen._target(self._field(P_TYPE), FrozenModel)
+
+    @property
+    def lower_bound(self):
+        return self._field(P_LOWER)
+
+    @property
+    def upper_bound(self):
+        return self._field(P_UPPER)
+
+
+class FrozenReference(_FrozenObject):
+    '''
+    Read-only reference.
+    '''
+    _fields = '_references'
+    _field_count = REFERENCE_FIELDS
+
+    @property
+    def uuid(self):
+        return self._frozen._string(self._field(R_UUID))
+
+    @property
+    def name(self):
+        return self._frozen._string(self._field(R_NAME))
+
+    @property
+    def owner(self):
+        return FrozenModel(self._frozen, self._field(R_OWNER))
+
+    @property
+    def type(self):
+        return self._frozen._target(self._field(R_TYPE), FrozenModel)
+
+    @property
+    def containment(self):
+        return bool(self._field(R_CONTAINMENT))
+
+    @property
+    def opposite(self):
+        return self._frozen._target(self._field(R_OPPOSITE), FrozenReference)
+
+    @property
+    def lower_bound(self):
+        return self._field(R_LOWER)
+
+    @property
+    def upper_bound(self):
+        return self._field(R_UPPER)
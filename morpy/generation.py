@@ -0,0 +1,192 @@
+#-*- coding: utf-8 -*-
+#######################################################################
+# Name: generation.py
+# Purpose: Incremental generation pipeline for MoRP languages
+# Author: Igor R. Dejanovic <igor DOT dejanovic AT gmail DOT com>
+# Copyright: (c) 2013 Igor R. Dejanovic <igor DOT dejanovic AT gmail DOT com>
+# License: MIT License
+#######################################################################
+'''
+Generators of a language are given as generator configuration mograms in
+Language.generators. Python implementation of each generator is
+registered for its configuration mogram with register_generator.
+
+Mograms are split into independent generation units (by default top-level
+models). Output for each unit is cached under a key made of the generator
+version, the configuration content hash and the unit content hash, so only
+units changed since they were last generated are regenerated.
+'''
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from morpy import stats
+from morpy.exceptions import DuplicateGenerator
+
+# Registered generators by configuration mogram UUID.
+_generators = {}
+
+
+class Generator(object):
+    '''
+    Implementation of a generator.
+
+    Attributes:
+        configuration(Mogram): Generator configuration mogram.
+        function(callable): Called with (configuration, unit) and returns
+            the generated output. When run in a process pool the output
+            must be picklable.
+        version(string): Version of the implementation. Changing it
+            invalidates cached outputs.
+        units(callable): Called with a mogram and returns its independent
+            generation units. By default these are top-level models.
+    '''
+    def __init__(self, configuration, function, version='1', units=None):
+        self.configuration = configuration
+        self.function = function
+        self.version = version
+        if units is not None:
+            self.units = units
+
+    def units(self, mogram):
+        return list(mogram.contents)
+
+    def key(self, unit):
+        '''
+        Returns cache key for the output of this generator for the given
+        unit.
+        '''
+        return (self.configuration.uuid, self.version,
+                self.configuration.content_hash, unit.uuid, unit.content_hash)
+
+    def generate(self, unit):
+        return self.function(self.configuration, unit)
+
+
+def register_generator(configuration, function, version='1', units=None):
+    '''
+    Registers generator implementation for the given configuration mogram.
+    Returns:
+        Generator instance.
+    '''
+    generator = Generator(configuration, function, version, units)
+    _generators[configuration.uuid] = generator
+    return generator
+
+
+def unregister_generator(configuration):
+    _generators.pop(configuration.uuid, None)
+
+
+def _generate(configuration_uuid, unit_uuid):
+    '''
+    Runs in a worker process. Worker processes are forked so the generator
+    and the unit are found in the inherited workspace instead of being
+    pickled.
+    '''
+    from morpy import Workspace
+    generator = _generators[configuration_uuid]
+    return generator.generate(Workspace().get_by_uuid(unit_uuid))
+
+
+class GenerationPipeline(object):
+    '''
+    Runs generators of a language over mograms.
+
+    Attributes:
+        language(Language): The language whose generators are run.
+        cache(dict): Outputs by generator/unit key. The last output of
+            each generated unit is kept across runs, so mograms left out of
+            a run are not regenerated when run again. Outputs of removed
+            units are kept until the cache is cleared.
+        processes(int): Number of worker processes. If None or 1, or if
+            forking is not supported by the platform, generation is done
+            in the current process.
+        generated(int): Number of units generated in the last run.
+        reused(int): Number of outputs taken from the cache in the last run.
+    '''
+    def __init__(self, language, cache=None, processes=None):
+        self.language = language
+        self.cache = {} if cache is None else cache
+        # Cache keys of the last outputs by (configuration UUID, unit UUID).
+        self._last = {}
+        self.processes = processes
+        self.generated = 0
+        self.reused = 0
+
+    def generators(self):
+        '''
+        Returns registered generators of the language.
+        '''
+        return [_generators[conf.uuid] for conf in self.language.generators
+                if conf.uuid in _generators]
+
+    def run(self, mograms):
+        '''
+        Runs all generators of the language over the given mograms.
+        Returns:
+            A dict of outputs keyed by (configuration name, unit uuid).
+        Raises:
+            DuplicateGenerator: If two configurations have the same name.
+        '''
+        collector = stats.collector
+        cache = self.cache
+        outputs = {}
+        keys = {}
+        jobs = []
+        generators = self.generators()
+        names = set()
+        for generator in generators:
+            name = generator.configuration.name
+            if name in names:
+                raise DuplicateGenerator(name)
+            names.add(name)
+        for generator in generators:
+            for mogram in mograms:
+                for unit in generator.units(mogram):
+                    key = generator.key(unit)
+                    output_key = (generator.configuration.name, unit.uuid)
+                    keys[output_key] = ((generator.configuration.uuid,
+                                         unit.uuid), key)
+                    hit = key in cache
+                    if collector is not None:
+                        collector.record_cache('generation', hit)
+                    if hit:
+                        outputs[output_key] = cache[key]
+                    else:
+                        jobs.append((generator, unit, output_key))
+
+        self.reused = len(outputs)
+        self.generated = len(jobs)
+
+        for (generator, unit, output_key), output in \
+                zip(jobs, self._generate(jobs)):
+            outputs[output_key] = output
+
+        # New outputs replace the previous outputs of their units.
+        last = self._last
+        for output_key, (unit_key, key) in keys.items():
+            previous = last.get(unit_key)
+            if previous is not None and previous != key:
+                cache.pop(previous, None)
+            last[unit_key] = key
+            cache[key] = outputs[output_key]
+
+        return outputs
+
+    def _generate(self, jobs):
+        if not jobs:
+            return []
+        if self.processes in (None, 1) or len(jobs) == 1 or \
+                'fork' not in multiprocessing.get_all_start_methods():
+            return [generator.generate(unit) for generator, unit, _ in jobs]
+
+        # Pool is created for each run so that forked workers see the
+        # current state of the workspace.
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=self.processes,
+                                 mp_context=context) as executor:
+            return list(executor.map(
+                _generate,
+                [generator.configuration.uuid for generator, _, _ in jobs],
+                [unit.uuid for _, unit, _ in jobs],
+                chunksize=max(1, len(jobs) // (self.processes * 4))))
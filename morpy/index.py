@@ -0,0 +1,271 @@
+#-*- coding: utf-8 -*-
+#######################################################################
+# Name: index.py
+# Purpose: Workspace wide name index for completion
+# Author: Igor R. Dejanovic <igor DOT dejanovic AT gmail DOT com>
+# Copyright: (c) 2013 Igor R. Dejanovic <igor DOT dejanovic AT gmail DOT com>
+# License: MIT License
+#######################################################################
+'''
+Name index of all models, properties and references in the mograms of the
+workspace, used e.g. for name completion in concrete syntax editors.
+
+The index is built on first access to Workspace().name_index and is kept
+up to date afterwards. Hot paths check the module level `name_index` and
+do nothing more if it is None.
+
+Each object is indexed under its casefolded name and the mogram containing
+it. Entries (name, uuid, mogram uuid) are kept in sorted partitions per
+meta and per mogram and meta so filtered searches scan only the matching
+partitions. A prefix search is a binary search followed by a scan of the
+matches. New entries go to a smaller sorted list of each partition which
+is merged into the main list when it grows over a fraction of it.
+
+Entries are never updated in place. The index keeps the last indexed name
+and mogram of each object, and entries that differ from them, as well as
+entries of freed objects and of mograms that are not in the catalog, are
+skipped when matched. Entries of renamed, moved and freed objects are
+dropped on merge.
+'''
+from bisect import bisect_left, insort
+from heapq import merge
+from itertools import islice
+
+# Active NameIndex or None if the index is not built.
+name_index = None
+
+# Minimal number of new entries merged into a partition at once.
+MERGE_THRESHOLD = 1024
+
+
+class _Partition(object):
+    '''
+    Sorted entries of a partition of the index.
+    '''
+    def __init__(self, entries=None):
+        self.entries = entries or []
+        self.pending = []
+
+
+class NameIndex(object):
+    '''
+    Index of models, properties and references by name.
+    '''
+    def __init__(self, workspace):
+        self.workspace = workspace
+        # Partitions keyed by meta UUID and by (mogram UUID, meta UUID).
+        self._partitions = {}
+        # Last indexed (casefolded name, mogram UUID) by object UUID.
+        self._names = {}
+        # Indexed metas by UUID.
+        self._metas = {}
+
+    def build(self):
+        '''
+        Indexes all models, properties and references of the mograms in the
+        workspace catalog.
+        '''
+        partitions = {}
+        names = {}
+        metas = {}
+        for mogram in self.workspace.catalog:
+            stack = list(mogram.contents)
+            while stack:
+                model = stack.pop()
+                objs = [model]
+                # Unloaded proxies are indexed further when loaded.
+                if model.loaded:
+                    objs += model.properties + model.references
+                    stack.extend(model.contents)
+                for obj in objs:
+                    key = obj.name.casefold()
+                    meta = obj.meta
+                    metas[meta.uuid] = meta
+                    names[obj.uuid] = (key, mogram.uuid)
+                    entry = (key, obj.uuid, mogram.uuid)
+                    partitions.setdefault(meta.uuid, []).append(entry)
+                    partitions.setdefault((mogram.uuid, meta.uuid),
+                                          []).append(entry)
+        self._partitions = dict((key, _Partition(sorted(entries)))
+                                for key, entries in partitions.items())
+        self._names = names
+        self._metas = metas
+
+    def _mogram_of(self, obj):
+        '''
+        Returns UUID of the mogram containing the object or None.
+        '''
+        from morpy.core import Mogram
+        owner = obj.owner
+        if owner is None:
+            return None
+        if isinstance(owner, Mogram):
+            return owner.uuid
+        indexed = self._names.get(owner.uuid)
+        return indexed[1] if indexed is not None else None
+
+    def add(self, obj):
+        '''
+        Indexes the object under its current name and mogram. Called when a
+        model, property or reference is created, renamed or moved. Owners
+        must be indexed before the objects they contain.
+        '''
+        name = obj.name
+        if not isinstance(name, str):
+            return
+        indexed = (name.casefold(), self._mogram_of(obj))
+        if self._names.get(obj.uuid) == indexed:
+            return
+        self._names[obj.uuid] = indexed
+        key, mogram = indexed
+        if mogram is None:
+            # Found again when added to a mogram.
+            return
+        meta = obj.meta
+        self._metas[meta.uuid] = meta
+        entry = (key, obj.uuid, mogram)
+        self._insert(meta.uuid, entry)
+        self._insert((mogram, meta.uuid), entry)
+
+    def add_subtree(self, container):
+        '''
+        Indexes all models, properties and references in the container and
+        the features of the container itself.
+        '''
+        stack = [container]
+        while stack:
+            node = stack.pop()
+            if node is not container:
+                self.add(node)
+            # Unloaded proxies are indexed further when loaded.
+            if not getattr(node, 'loaded', True):
+                continue
+            for feature in getattr(node, 'properties', ()):
+                self.add(feature)
+            for feature in getattr(node, 'references', ()):
+                self.add(feature)
+            stack.extend(node.contents)
+
+    def _insert(self, partition_key, entry):
+        partition = self._partitions.get(partition_key)
+        if partition is None:
+            partition = self._partitions[partition_key] = _Partition()
+        insort(partition.pending, entry)
+        if len(partition.pending) > max(MERGE_THRESHOLD,
+                                        len(partition.entries) // 8):
+            self._merge(partition)
+
+    def _merge(self, partition):
+        '''
+        Merges new entries of the partition into its main list dropping
+        entries of renamed, moved and freed objects.
+        '''
+        names = self._names
+        by_uuid = self.workspace.by_uuid
+        entries = []
+        for entry in merge(partition.entries, partition.pending):
+            uuid = entry[1]
+            if uuid not in by_uuid:
+                names.pop(uuid, None)
+            elif names.get(uuid) == (entry[0], entry[2]):
+                entries.append(entry)
+        partition.entries = entries
+        partition.pending = []
+
+    def merge_all(self):
+        '''
+        Merges new entries of all partitions.
+        '''
+        for partition in self._partitions.values():
+            self._merge(partition)
+
+    def __len__(self):
+        '''
+        Number of entries including the not yet dropped invalid ones.
+        '''
+        return sum(len(p.entries) + len(p.pending)
+                   for key, p in self._partitions.items()
+                   if not isinstance(key, tuple))
+
+    def complete(self, prefix, meta=None, mogram=None, case_sensitive=False,
+                 limit=50):
+        '''
+        Returns models, properties and references whose names start with
+        the given prefix, ordered by casefolded name.
+        Args:
+            prefix(string):
+            meta(Model or string): Only objects of this meta (e.g.
+                Workspace().prop) or meta name (e.g. 'Property').
+            mogram(Mogram or string): Only objects contained in this mogram
+                or the free mogram with this name (see MogramCatalog.get).
+            case_sensitive(bool): Match the prefix case sensitively.
+            limit(int): Maximal number of returned objects or None for all.
+        '''
+        return list(islice(self._search(prefix, meta, mogram, case_sensitive,
+                                        exact=False), limit))
+
+    def find(self, name, meta=None, mogram=None, case_sensitive=False):
+        '''
+        Returns all models, properties and references with the given name.
+        See complete for the filters.
+        '''
+        return list(self._search(name, meta, mogram, case_sensitive,
+                                 exact=True))
+
+    def _selected(self, meta, mogram):
+        '''
+        Returns partitions of the objects passing the filters.
+        '''
+        if meta is None:
+            metas = list(self._metas)
+        elif isinstance(meta, str):
+            metas = [uuid for uuid, m in self._metas.items()
+                     if m.name == meta]
+        else:
+            metas = [meta.uuid]
+        if mogram is None:
+            keys = metas
+        else:
+            if isinstance(mogram, str):
+                mogram = self.workspace.catalog.get(mogram)
+                if mogram is None:
+                    return []
+            keys = [(mogram.uuid, meta) for meta in metas]
+        partitions = self._partitions
+        return [partitions[key] for key in keys if key in partitions]
+
+    def _search(self, prefix, meta, mogram, case_sensitive, exact):
+        key = prefix.casefold()
+        by_uuid = self.workspace.by_uuid
+        cataloged = self.workspace.catalog.uuids
+        names = self._names
+        scans = []
+        for partition in self._selected(meta, mogram):
+            scans.append(self._scan(partition.entries, key))
+            scans.append(self._scan(partition.pending, key))
+        seen = set()
+        for entry_key, uuid, mogram_uuid in merge(*scans):
+            if exact and entry_key != key:
+                continue
+            if names.get(uuid) != (entry_key, mogram_uuid) or \
+                    uuid in seen or mogram_uuid not in cataloged:
+                continue
+            obj = by_uuid.get(uuid)
+            if obj is None:
+                continue
+            if case_sensitive and not (obj.name == prefix if exact
+                                       else obj.name.startswith(prefix)):
+                continue
+            seen.add(uuid)
+            yield obj
+
+    @staticmethod
+    def _scan(entries, key):
+        '''
+        Yields entries starting with the key.
+        '''
+        for position in range(bisect_left(entries, (key,)), len(entries)):
+            entry = entries[position]
+            if not entry[0].startswith(key):
+                return
+            yield entry
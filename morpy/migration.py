@@ -0,0 +1,125 @@
+#-*- coding: utf-8 -*-
+#######################################################################
+# Name: migration.py
+# Purpose: Lazy migration of model instances
+# Author: Igor R. Dejanovic <igor DOT dejanovic AT gmail DOT com>
+# Copyright: (c) 2013 Igor R. Dejanovic <igor DOT dejanovic AT gmail DOT com>
+# License: MIT License
+#######################################################################
+'''
+Instances of a model are migrated lazily when the model changes.
+
+Each Model has a meta version which is increased when its properties,
+references or super models change. Models inheriting from it are
+increased too. Changes of models therefore do not touch the instances.
+Each ModelInst records the meta version it was last upgraded to and is
+upgraded on the first access after a change by running the migrations
+registered since that version:
+
+    person.create_property('age', integer)
+    register_migration(person, lambda values: values.setdefault('age', 0))
+
+Values of features that no longer exist are dropped after migrations run.
+Stale instances may also be upgraded ahead of access in batches:
+
+    for count in migrate_batches(person, batch_size=1000):
+        pass  # Other work may be done between batches.
+'''
+import weakref
+
+# Lists of (meta version, migration) by model.
+_migrations = weakref.WeakKeyDictionary()
+
+# Instances by UUID in dicts keyed by their model.
+_extents = weakref.WeakKeyDictionary()
+
+
+def specializations(model):
+    '''
+    Returns a list of the given model and all models inheriting from it
+    directly or indirectly.
+    '''
+    models = [model]
+    seen = set([id(model)])
+    for model in models:
+        for inherited in model.inherited_models:
+            if id(inherited) not in seen:
+                seen.add(id(inherited))
+                models.append(inherited)
+    return models
+
+
+def register_migration(model, migration):
+    '''
+    Registers a migration of the instances of the model, and of models
+    inheriting from it, created before the current meta version. Register
+    migrations right after the change of the model they migrate.
+    Args:
+        model(Model): Changed model.
+        migration(callable): Called with a dict of instance values by
+            feature name which it updates in place.
+    '''
+    for model in specializations(model):
+        _migrations.setdefault(model, []).append((model.meta_version,
+                                                  migration))
+
+
+def track(instance):
+    '''
+    Adds the instance to the extent of its model. Called by ModelInst.
+    '''
+    extent = _extents.get(instance.meta)
+    if extent is None:
+        extent = _extents[instance.meta] = weakref.WeakValueDictionary()
+    extent[instance.uuid] = instance
+
+
+def extent(model):
+    '''
+    Returns a list of existing instances of the model, not including
+    instances of models inheriting from it.
+    '''
+    return list(_extents.get(model, {}).values())
+
+
+def upgrade(instance):
+    '''
+    Upgrades the instance to the current meta version of its model.
+    '''
+    model = instance.meta
+    attrs = instance.__dict__
+    version = attrs['_version']
+    values = attrs['_values']
+    for target, migration in _migrations.get(model, ()):
+        if target > version:
+            migration(values)
+    features = model.features
+    for name in [n for n in values if n not in features]:
+        del values[name]
+    attrs['_version'] = model.meta_version
+
+
+def migrate_batches(model, batch_size=1000):
+    '''
+    Generator that upgrades stale instances of the model, and of models
+    inheriting from it, in batches. Yields the number of instances upgraded
+    in each batch. Instances created meanwhile are not visited but are
+    created at the current meta version.
+    '''
+    upgraded = 0
+    for model in specializations(model):
+        extent = _extents.get(model)
+        if extent is None:
+            continue
+        for ref in extent.valuerefs():
+            instance = ref()
+            if instance is None or \
+                    instance.__dict__['_version'] == model.meta_version:
+                continue
+            upgrade(instance)
+            upgraded += 1
+            if upgraded == batch_size:
+                yield upgraded
+                upgraded = 0
+    if upgraded:
+        yield upgraded
@@ -0,0 +1,339 @@
+#-*- coding: utf-8 -*-
+#######################################################################
+# Name: proxy.py
+# Purpose: Lazy loading of model subtrees
+# Author: Igor R. Dejanovic <igor DOT dejanovic AT gmail DOT com>
+# Copyright: (c) 2013 Igor R. Dejanovic <igor DOT dejanovic AT gmail DOT com>
+# License: MIT License
+#######################################################################
+'''
+Model proxies stand in for models whose contents, properties, references
+and super models are not loaded. They are loaded transparently on first
+access from a backing store, i.e. any object with fetch_by_uuid method
+(see morpy.repository.AbstractRepository) returning model records as
+produced by to_record. Inner models are created as proxies too, so a
+subtree is loaded level by level as it is accessed.
+
+ProxyLoader keeps loaded proxies in LRU order and unloads the least
+recently used ones when the number of loaded proxies exceeds its budget.
+Proxies changed after loading are never unloaded. Unloading is transparent
+to loaded objects: models of the unloaded subtree that are still referenced
+(e.g. as reference types) keep their owners, references whose opposites are
+loaded are kept, and both are reused when the subtree is loaded again.
+'''
+from collections import OrderedDict
+import weakref
+
+from morpy import stats
+from morpy.core import Model, ModelContainer, MoRPContainer, Property, \
+    Reference, _ident
+from morpy.repository import AbstractRepository
+
+# Attributes loaded on first access.
+LAZY_ATTRIBUTES = ('contents', 'properties', 'references', 'super_models')
+
+
+def to_record(model):
+    '''
+    Returns model record, i.e. a dict of plain values describing the model
+    without its inner models, which are given only by their headers.
+    '''
+    return {
+        'uuid': model.uuid,
+        'name': model.name,
+        'abstract': model.abstract,
+        'properties': [{
+            'uuid': p.uuid,
+            'name': p.name,
+            'type': _ident(p.type),
+            'lower_bound': p.lower_bound,
+            'upper_bound': p.upper_bound,
+        } for p in model.properties],
+        'references': [{
+            'uuid': r.uuid,
+            'name': r.name,
+            'type': _ident(r.type),
+            'containment': r.containment,
+            'opposite': _ident(r.opposite),
+            'opposite_owner': _ident(r.opposite.owner) if r.opposite else None,
+            'lower_bound': r.lower_bound,
+            'upper_bound': r.upper_bound,
+        } for r in model.references],
+        'super_models': [m.uuid for m in model.super_models],
+        'contents': [{
+            'uuid': m.uuid,
+            'name': m.name,
+            'abstract': m.abstract,
+        } for m in model.contents],
+    }
+
+
+class RecordStore(AbstractRepository):
+    '''
+    In-memory store of model records.
+    '''
+    def __init__(self):
+        self.records = {}
+
+    def add(self, model):
+        '''
+        Stores records of the model and all its inner models.
+        '''
+        stack = [model]
+        while stack:
+            model = stack.pop()
+            self.records[model.uuid] = to_record(model)
+            stack.extend(model.contents)
+
+    def fetch_by_uuid(self, uuid):
+        return self.records[uuid]
+
+
+class ModelProxy(Model):
+    '''
+    Model whose lazy attributes are loaded on first access.
+    '''
+    _cloned = ('_loader', '_loading', '_dirty')
+
+    def __init__(self, loader, uuid, name, owner=None, abstract=False):
+        self._loader = loader
+        self._loading = True
+        super(ModelProxy, self).__init__(name, owner=owner,
+                                         abstract=abstract, uuid=uuid)
+        for attr in LAZY_ATTRIBUTES:
+            del self.__dict__[attr]
+        self._loading = False
+        self._dirty = False
+
+    def __getattr__(self, name):
+        # Called only for attributes that are not found, i.e. lazy
+        # attributes of unloaded proxy.
+        if name in LAZY_ATTRIBUTES and not self.__dict__.get('_loading'):
+            self._loader.load(self)
+            return self.__dict__[name]
+        raise AttributeError(name)
+
+    @property
+    def loaded(self):
+        return 'contents' in self.__dict__
+
+    @property
+    def dirty(self):
+        return self._dirty
+
+    def by_name(self, name):
+        self._loader.touch(self)
+        return super(ModelProxy, self).by_name(name)
+
+    def by_uuid(self, uuid):
+        self._loader.touch(self)
+        return super(ModelProxy, self).by_uuid(uuid)
+
+    def _invalidate_hash(self):
+        if not self._loading:
+            # Mark this proxy and its owners as changed so they are not
+            # unloaded.
+            node = self
+            while isinstance(node, ModelProxy) and not node._dirty:
+                node._dirty = True
+                node = node.owner
+        super(ModelProxy, self)._invalidate_hash()
+
+
+class ProxyLoader(object):
+    '''
+    Loads model proxies from a backing store.
+
+    Attributes:
+        store: Object with fetch_by_uuid(uuid) method returning records.
+        budget(int): Maximal number of loaded proxies. None for no limit.
+    '''
+    def __init__(self, store, budget=None):
+        self.store = store
+        self.budget = budget
+        # Loaded proxies in LRU order.
+        self._loaded = OrderedDict()
+        # Loading may load other proxies, e.g. owners of opposite references.
+        self._depth = 0
+        # Proxies of opposite owners created before their owners are
+        # loaded. Kept alive until attached as opposites are weak.
+        self._detached = {}
+        # References of unloaded proxies whose opposites are loaded.
+        self._pinned = {}
+
+    def proxy(self, uuid, owner=None):
+        '''
+        Returns unloaded proxy for the stored model with the given UUID.
+        '''
+        from morpy import Workspace
+        existing = Workspace().by_uuid.get(uuid)
+        if existing is not None:
+            if owner is not None and existing.owner is not owner:
+                owner.add_model(existing)
+            return existing
+        record = self.store.fetch_by_uuid(uuid)
+        return ModelProxy(self, uuid, record['name'], owner=owner,
+                          abstract=record['abstract'])
+
+    @property
+    def loaded_count(self):
+        return len(self._loaded)
+
+    def load(self, proxy):
+        '''
+        Loads lazy attributes of the given proxy.
+        '''
+        from morpy import Workspace
+        registry = Workspace().by_uuid
+
+        if stats.collector is not None:
+            stats.collector.record_cache('proxy', False)
+
+        record = self.store.fetch_by_uuid(proxy.uuid)
+
+        def resolve(value):
+            if value is None:
+                return None
+            obj = registry.get(value)
+            if obj is None:
+                # Referenced model not loaded yet.
+                obj = self.proxy(value)
+            return obj
+
+        proxy._loading = True
+        self._depth += 1
+        try:
+            attrs = proxy.__dict__
+            attrs['contents'] = MoRPContainer()
+            attrs['properties'] = []
+            attrs['references'] = []
+            attrs['super_models'] = MoRPContainer()
+            for header in record['contents']:
+                self._detached.pop(header['uuid'], None)
+                existing = registry.get(header['uuid'])
+                if existing is not None and existing.owner is proxy:
+                    # Kept while this proxy was unloaded.
+                    attrs['contents'].append(existing)
+                elif existing is not None:
+                    proxy.add_model(existing)
+                else:
+                    ModelProxy(self, header['uuid'], header['name'],
+                               owner=proxy, abstract=header['abstract'])
+            for data in record['properties']:
+                prop = registry.get(data['uuid'])
+                if prop is None:
+                    prop = Property(
+                        data['name'], resolve(data['type']), proxy,
+                        uuid=data['uuid'], lower_bound=data['lower_bound'],
+                        upper_bound=data['upper_bound'])
+                proxy.properties.append(prop)
+            for data in record['references']:
+                reference = self._pinned.pop(data['uuid'], None) or \
+                    registry.get(data['uuid'])
+                if reference is None:
+                    reference = Reference(
+                        data['name'], resolve(data['type']), proxy,
+                        containment=data['containment'],
+                        uuid=data['uuid'], lower_bound=data['lower_bound'],
+                        upper_bound=data['upper_bound'])
+                proxy.references.append(reference)
+                if data['opposite'] is None or reference.opposite is not None:
+                    continue
+                opposite = registry.get(data['opposite'])
+                if opposite is None:
+                    # Loading of the opposite owner links both sides.
+                    owner = resolve(data['opposite_owner'])
+                    if owner.owner is None:
+                        self._detached[owner.uuid] = owner
+                    owner.references
+                elif opposite.opposite is not reference:
+                    # Linking restores the stored state so the other side
+                    # must not be marked as changed.
+                    reference.__dict__['_opposite'] = weakref.ref(opposite)
+                    opposite.__dict__['_opposite'] = weakref.ref(reference)
+                    if opposite.owner is not None:
+                        ModelContainer._invalidate_hash(opposite.owner)
+            for uuid in record['super_models']:
+                proxy.add_super_model(resolve(uuid))
+        finally:
+            proxy._loading = False
+            self._depth -= 1
+
+        self._loaded[proxy] = None
+        self.touch(proxy)
+        if not self._depth:
+            self.enforce_budget(keep=proxy)
+
+    def touch(self, proxy):
+        '''
+        Marks the proxy and its loaded owners as recently used.
+        '''
+        loaded = self._loaded
+        node = proxy
+        path = []
+        while isinstance(node, ModelProxy):
+            path.append(node)
+            node = node.owner
+        # Owners are used more recently than inner models.
+        for node in path:
+            if node in loaded:
+                loaded.move_to_end(node)
+
+    def enforce_budget(self, keep=None):
+        '''
+        Unloads least recently used unchanged proxies until the number of
+        loaded proxies is within the budget.
+        Args:
+            keep(ModelProxy): Proxy that must stay loaded together with its
+                owners.
+        '''
+        if self.budget is None:
+            return
+        protected = set()
+        node = keep
+        while isinstance(node, ModelProxy):
+            protected.add(node)
+            node = node.owner
+        for proxy in list(self._loaded):
+            if len(self._loaded) <= self.budget:
+                break
+            if proxy in protected or proxy.dirty or proxy not in self._loaded:
+                continue
+            self.unload(proxy)
+
+    def unload(self, proxy):
+        '''
+        Unloads the proxy and its loaded inner proxies. Inner models,
+        properties and references are freed unless referenced from
+        elsewhere, in which case they are reused when the proxy is loaded
+        again. References whose opposites stay loaded are kept alive.
+        '''
+        if 'contents' not in proxy.__dict__:
+            return
+        unloaded = []
+        stack = [proxy]
+        while stack:
+            node = stack.pop()
+            unloaded.append(node)
+            stack.extend(m for m in node.__dict__['contents']
+                         if isinstance(m, ModelProxy) and m.loaded)
+        unloaded_ids = set(id(node) for node in unloaded)
+
+        for node in unloaded:
+            attrs = node.__dict__
+            for reference in attrs['references']:
+                opposite = reference.opposite
+                if opposite is None:
+                    continue
+                owner = opposite.owner
+                if owner is not None and id(owner) not in unloaded_ids and \
+                        'references' in owner.__dict__:
+                    self._pinned[reference.uuid] = reference
+                else:
+                    # The other side is unloaded as well.
+                    self._pinned.pop(opposite.uuid, None)
+            for super_model in attrs['super_models']:
+                super_model.inherited_models.discard(node)
+            for attr in LAZY_ATTRIBUTES:
+                del attrs[attr]
+            self._loaded.pop(node, None)
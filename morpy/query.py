@@ -0,0 +1,319 @@
+#-*- coding: utf-8 -*-
+#######################################################################
+# Name: query.py
+# Purpose: Path queries over MoRP object graph
+# Author: Igor R. Dejanovic <igor DOT dejanovic AT gmail DOT com>
+# Copyright: (c) 2013 Igor R. Dejanovic <igor DOT dejanovic AT gmail DOT com>
+# License: MIT License
+#######################################################################
+'''
+Path queries select MoRP objects starting from a context object, e.g.:
+
+    contents/*[abstract=false]/properties[type=Integer]
+
+A query is a sequence of steps separated by '/'. Each step transforms the
+stream of objects produced by the previous step:
+
+    contents, properties, references,
+    super_models, inherited_models  - related objects of each object.
+    **                              - all models contained in each object,
+                                      recursively, in depth-first order.
+    ..                              - owner of each object.
+    *                               - any object (no filtering).
+    Name or 'Name'                  - objects with the given name.
+
+Each step may be followed by predicates [attribute=value] or
+[attribute!=value]. Attribute is any object attribute (e.g. name, abstract,
+containment, lower_bound, upper_bound). References to other objects (type,
+meta, opposite, owner) are compared by name or UUID. Special attribute 'isa'
+tests whether a model is, or inherits from, a model with the given name or
+UUID. Values are true, false, none, integers, bare names or quoted
+strings.
+
+Queries are compiled once to chains of generator functions and cached, so
+results are produced lazily.
+'''
+import re
+
+from morpy import stats
+from morpy.exceptions import QuerySyntaxError
+
+# Maximal number of compiled queries kept in the cache.
+CACHE_SIZE = 256
+
+_cache = {}
+
+AXES = ('contents', 'properties', 'references', 'super_models',
+        'inherited_models')
+
+_TOKENS = re.compile(r'''
+    \s*(?:
+        (?P<string>'[^']*'|"[^"]*")
+       |(?P<number>-?\d+(?![\w.-]))
+       |(?P<op>!=|=|\*\*|\*|\.\.|/|\[|\])
+       |(?P<ident>[A-Za-z_][\w.-]*)
+    )''', re.VERBOSE)
+
+_LITERALS = {'true': True, 'false': False, 'none': None}
+
+
+def _tokenize(query):
+    tokens = []
+    pos = 0
+    query_len = len(query)
+    while pos < query_len:
+        match = _TOKENS.match(query, pos)
+        if not match or match.end() == pos:
+            if query[pos:].strip() == '':
+                break
+            raise QuerySyntaxError(query, pos, 'unexpected character')
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'string':
+            value = value[1:-1]
+        elif kind == 'number':
+            value = int(value)
+        tokens.append((kind, value, match.start(kind)))
+        pos = match.end()
+    tokens.append(('end', None, query_len))
+    return tokens
+
+
+class _Parser(object):
+
+    def __init__(self, query):
+        self.query = query
+        self.tokens = _tokenize(query)
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos]
+
+    def next(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def error(self, message):
+        raise QuerySyntaxError(self.query, self.peek()[2], message)
+
+    def expect(self, value):
+        kind, token_value, _ = self.peek()
+        if kind != 'op' or token_value != value:
+            self.error("expected '%s'" % value)
+        self.next()
+
+    def parse(self):
+        '''
+        Returns a list of steps. Each step is a tuple
+        (kind, argument, predicates).
+        '''
+        steps = [self.step()]
+        while self.peek()[:2] == ('op', '/'):
+            self.next()
+            steps.append(self.step())
+        if self.peek()[0] != 'end':
+            self.error('unexpected token')
+        return steps
+
+    def step(self):
+        kind, value, _ = self.next()
+        if kind == 'op' and value in ('*', '**', '..'):
+            step = (value, None)
+        elif kind == 'ident' and value in AXES:
+            step = ('axis', value)
+        elif kind in ('ident', 'string'):
+            step = ('name', value)
+        else:
+            self.pos -= 1
+            self.error('expected a step')
+        predicates = []
+        while self.peek()[:2] == ('op', '['):
+            self.next()
+            predicates.append(self.predicate())
+            self.expect(']')
+        return step + (predicates,)
+
+    def predicate(self):
+        kind, attribute, _ = self.next()
+        if kind != 'ident':
+            self.pos -= 1
+            self.error('expected an attribute name')
+        kind, op, _ = self.next()
+        if kind != 'op' or op not in ('=', '!='):
+            self.pos -= 1
+            self.error("expected '=' or '!='")
+        kind, value, _ = self.next()
+        if kind == 'ident':
+            value = _LITERALS.get(value.lower(), value)
+        elif kind not in ('string', 'number'):
+            self.pos -= 1
+            self.error('expected a value')
+        return (attribute, op, value)
+
+
+def _matches_ref(obj, value):
+    '''
+    Tests if referenced object is given by the value (name or UUID).
+    '''
+    if obj is None or value is None:
+        return obj is value
+    return getattr(obj, 'name', None) == value or \
+        getattr(obj, 'uuid', None) == value
+
+
+def _isa(model, value):
+    '''
+    Tests if model is, or inherits from, the model given by name or UUID.
+    '''
+    seen = set()
+    stack = [model]
+    while stack:
+        model = stack.pop()
+        if _matches_ref(model, value):
+            return True
+        for super_model in getattr(model, 'super_models', ()):
+            if super_model not in seen:
+                seen.add(super_model)
+                stack.append(super_model)
+    return False
+
+
+_MISSING = object()
+
+
+def _compile_predicate(attribute, op, value):
+    if attribute == 'isa':
+        def test(obj):
+            return _isa(obj, value)
+    elif attribute in ('type', 'meta', 'opposite', 'owner'):
+        def test(obj):
+            ref = getattr(obj, attribute, _MISSING)
+            return ref is not _MISSING and _matches_ref(ref, value)
+    else:
+        def test(obj):
+            return getattr(obj, attribute, _MISSING) == value
+
+    if op == '!=':
+        positive = test
+
+        def test(obj):
+            return not positive(obj)
+    return test
+
+
+def _compile_step(kind, argument, predicates):
+    '''
+    Returns a function transforming an iterable of objects to an iterator.
+    '''
+    uuids = [v for a, op, v in predicates if a == 'uuid' and op == '=']
+    if kind == 'axis':
+        def step(objs):
+            for obj in objs:
+                for related in getattr(obj, argument, ()):
+                    yield related
+    elif kind == '**' and uuids:
+        # Use workspace UUID registry instead of searching.
+        uuid = uuids[0]
+
+        def step(objs):
+            from morpy import Workspace
+            target = Workspace().by_uuid.get(uuid)
+            if target is None or not hasattr(target, 'contents'):
+                return
+            for obj in objs:
+                owner = target.owner
+                while owner is not None and owner is not obj:
+                    owner = owner.owner
+                if owner is not None:
+                    yield target
+    elif kind == '**':
+        def step(objs):
+            for obj in objs:
+                stack = [iter(getattr(obj, 'contents', ()))]
+                while stack:
+                    for model in stack[-1]:
+                        yield model
+                        stack.append(iter(model.contents))
+                        break
+                    else:
+                        stack.pop()
+    elif kind == '..':
+        def step(objs):
+            for obj in objs:
+                owner = getattr(obj, 'owner', None)
+                if owner is not None:
+                    yield owner
+    elif kind == 'name':
+        def step(objs):
+            for obj in objs:
+                if getattr(obj, 'name', None) == argument:
+                    yield obj
+    else:
+        step = None
+
+    if predicates:
+        tests = [_compile_predicate(*p) for p in predicates]
+
+        def test(obj):
+            for t in tests:
+                if not t(obj):
+                    return False
+            return True
+
+        if step is None:
+            def step(objs):
+                return filter(test, objs)
+        else:
+            navigate = step
+
+            def step(objs):
+                return filter(test, navigate(objs))
+    return step
+
+
+class CompiledQuery(object):
+    '''
+    Compiled path query. Call it with a context object to get an iterator
+    over the results.
+    '''
+    def __init__(self, query):
+        self.query = query
+        steps = [_compile_step(*s) for s in _Parser(query).parse()]
+        self._steps = [s for s in steps if s is not None]
+
+    def __call__(self, context):
+        objs = iter((context,))
+        for step in self._steps:
+            objs = step(objs)
+        return objs
+
+    def __repr__(self):
+        return "<CompiledQuery '%s'>" % self.query
+
+
+def compile_query(path):
+    '''
+    Returns compiled query for the given query string. Compiled queries are
+    cached.
+    '''
+    compiled = _cache.pop(path, None)
+    collector = stats.collector
+    if collector is not None:
+        collector.record_cache('query', compiled is not None)
+    if compiled is None:
+        compiled = CompiledQuery(path)
+        if len(_cache) >= CACHE_SIZE:
+            # Drop the least recently used query.
+            del _cache[next(iter(_cache))]
+    # Reinsert to keep the cache in the order of use.
+    _cache[path] = compiled
+    return compiled
+
+
+def query(context, path):
+    '''
+    Returns an iterator over the objects selected by the query starting
+    from the context object.
+    '''
+    return compile_query(path)(context)
@@ -0,0 +1,291 @@
+#-*- coding: utf-8 -*-
+#######################################################################
+# Name: replication.py
+# Purpose: Operation log based replication between workspaces
+# Author: Igor R. Dejanovic <igor DOT dejanovic AT gmail DOT com>
+# Copyright: (c) 2013 Igor R. Dejanovic <igor DOT dejanovic AT gmail DOT com>
+# License: MIT License
+#######################################################################
+'''
+When enabled with Workspace().enable_oplog() every change of languages and
+mograms created through the workspace is appended to an operation log.
+Operations refer to objects by UUID. Deltas since a given sequence number
+are exported as compact JSON and replayed on other workspaces with
+Workspace().apply_delta(). Replaying is idempotent.
+
+Objects are referenced weakly from the workspace, so a logged object that
+is freed at the source is logged as deleted. Replicas keep the objects
+created by deltas alive until their deletion is applied.
+
+Logged operations:
+
+    language   uuid, name, abstract syntax uuid
+    mogram     uuid, name, conforms_to, True if added to the catalog
+    catalog    uuid, True if added to/False if removed from the catalog
+    model      uuid, owner, name, abstract, super models
+    property   uuid, owner, name, type, lower bound, upper bound
+    reference  uuid, owner, name, type, containment, opposite,
+               lower bound, upper bound
+    set        uuid, attribute, value
+    move       uuid, new owner (None if removed)
+    super      uuid, super model, True if added/False if removed
+    delete     uuid
+'''
+import json
+from uuid import uuid4
+import weakref
+
+from morpy.exceptions import ReplicationError
+
+# Active OperationLog instance or None if logging is disabled.
+log = None
+
+# Attributes whose values are references to other objects.
+REFERENCE_ATTRIBUTES = ('type', 'opposite', 'conforms_to')
+
+
+def _ident(obj):
+    return getattr(obj, 'uuid', obj)
+
+
+class OperationLog(object):
+    '''
+    Append-only log of operations.
+
+    Attributes:
+        source(string): Unique identifier of this log.
+        entries(list): Operations as lists [seq, op, uuid, args...].
+            Sequence numbers start at 1.
+    '''
+    def __init__(self, source=None):
+        self.source = source or str(uuid4())
+        self.entries = []
+        # Weak references to logged objects by UUID.
+        self._refs = {}
+
+    @property
+    def last_seq(self):
+        return len(self.entries)
+
+    def append(self, op, uuid, *args):
+        self.entries.append([len(self.entries) + 1, op, uuid] + list(args))
+
+    def track(self, obj):
+        '''
+        Logs deletion of the created object when it is freed.
+        '''
+        uuid = obj.uuid
+
+        def freed(ref):
+            if self._refs.get(uuid) is ref:
+                del self._refs[uuid]
+                self.append('delete', uuid)
+        self._refs[uuid] = weakref.ref(obj, freed)
+
+    def created(self, obj):
+        '''
+        Logs creation of a model, property or reference.
+        '''
+        from morpy.core import Model, Property
+        self.track(obj)
+        if isinstance(obj, Model):
+            self.append('model', obj.uuid, _ident(obj.owner), obj.name,
+                        obj.abstract, [m.uuid for m in obj.super_models])
+        elif isinstance(obj, Property):
+            self.append('property', obj.uuid, _ident(obj.owner), obj.name,
+                        _ident(obj.type), obj.lower_bound, obj.upper_bound)
+        else:
+            self.append('reference', obj.uuid, _ident(obj.owner), obj.name,
+                        _ident(obj.type), obj.containment,
+                        _ident(obj.opposite), obj.lower_bound,
+                        obj.upper_bound)
+
+    def cloned(self, objs):
+        '''
+        Logs creation of copies made by Model.clone or Mogram.clone.
+        Args:
+            objs(list): Copies in containment pre-order.
+        '''
+        from morpy.core import Model, Mogram, Reference
+        # Types, super models and opposites may refer to objects that come
+        # later so containers are logged first and cross references last.
+        models = [o for o in objs if isinstance(o, Model)]
+        for obj in objs:
+            self.track(obj)
+        for obj in objs:
+            if isinstance(obj, Mogram):
+                self.append('mogram', obj.uuid, obj.name,
+                            _ident(obj.conforms_to), False)
+            elif isinstance(obj, Model):
+                self.append('model', obj.uuid, _ident(obj.owner), obj.name,
+                            obj.abstract, [])
+        for obj in objs:
+            if isinstance(obj, Reference):
+                self.append('reference', obj.uuid, obj.owner.uuid, obj.name,
+                            _ident(obj.type), obj.containment, None,
+                            obj.lower_bound, obj.upper_bound)
+            elif not isinstance(obj, (Model, Mogram)):
+                self.created(obj)
+        for model in models:
+            for super_model in model.super_models:
+                self.super_changed(model, super_model, True)
+        for obj in objs:
+            if isinstance(obj, Reference) and obj.opposite is not None:
+                self.changed(obj, 'opposite')
+
+    def changed(self, obj, attr):
+        value = getattr(obj, attr)
+        if attr in REFERENCE_ATTRIBUTES:
+            value = _ident(value)
+        self.append('set', obj.uuid, attr, value)
+
+    def moved(self, obj, owner):
+        self.append('move', obj.uuid, _ident(owner))
+
+    def super_changed(self, model, super_model, added):
+        self.append('super', model.uuid, super_model.uuid, added)
+
+    def export_delta(self, since=0):
+        '''
+        Returns operations with sequence numbers greater than `since` as
+        JSON encoded bytes.
+        '''
+        return json.dumps({'source': self.source,
+                           'ops': self.entries[since:]},
+                          separators=(',', ':')).encode('utf-8')
+
+
+def apply_delta(data, applied, objects=None):
+    '''
+    Replays delta exported by OperationLog.export_delta in the workspace.
+    Args:
+        data(bytes): Encoded delta.
+        applied(dict): Last applied sequence number by source. Updated by
+            this function. Operations already applied are skipped.
+        objects(dict): Objects created by applied deltas by UUID, kept
+            alive until their deletion is applied. Defaults to
+            Workspace().replicated.
+    Returns:
+        Number of applied operations.
+    Raises:
+        ReplicationError: If an operation refers to an unknown object.
+            Operations before it remain applied.
+    '''
+    from morpy import Workspace
+
+    workspace = Workspace()
+    if objects is None:
+        objects = workspace.replicated
+    delta = json.loads(data.decode('utf-8'))
+    source = delta['source']
+    last_seq = applied.get(source, 0)
+
+    count = 0
+    try:
+        for entry in delta['ops']:
+            seq = entry[0]
+            if seq <= last_seq:
+                continue
+            _apply(workspace, objects, entry)
+            count += 1
+            last_seq = seq
+    finally:
+        applied[source] = last_seq
+    return count
+
+
+def _apply(workspace, objects, entry):
+    '''
+    Applies a single logged operation.
+    '''
+    from morpy.core import Model, Mogram
+
+    registry = workspace.by_uuid
+    seq, op, uuid, args = entry[0], entry[1], entry[2], entry[3:]
+
+    def resolve(value):
+        return registry.get(value, value) if value is not None else None
+
+    def lookup(value):
+        obj = registry.get(value)
+        if obj is None:
+            raise ReplicationError(seq, op, value)
+        return obj
+
+    if op == 'language':
+        name, abssyn_uuid = args
+        if uuid not in registry:
+            workspace.create_language(name, uuid=uuid,
+                                      abssyn_uuid=abssyn_uuid)
+    elif op == 'mogram':
+        name, conforms_to, cataloged = args
+        if uuid not in registry:
+            objects[uuid] = Mogram(name, resolve(conforms_to), uuid=uuid)
+        if cataloged:
+            workspace.catalog.add(registry[uuid])
+    elif op == 'catalog':
+        mogram = registry.get(uuid)
+        if mogram is not None:
+            if args[0]:
+                workspace.catalog.add(mogram)
+            elif mogram in workspace.catalog:
+                workspace.catalog.remove(mogram)
+    elif op == 'model':
+        owner, name, abstract, super_models = args
+        if uuid not in registry:
+            objects[uuid] = Model(
+                name, owner=owner and lookup(owner), abstract=abstract,
+                super_models=[lookup(s) for s in super_models], uuid=uuid)
+    elif op == 'property':
+        owner, name, type_, lower_bound, upper_bound = args
+        if uuid not in registry:
+            objects[uuid] = lookup(owner).create_property(
+                name, resolve(type_), lower_bound=lower_bound,
+                upper_bound=upper_bound, uuid=uuid)
+    elif op == 'reference':
+        owner, name, type_, containment, opposite, lower_bound, \
+            upper_bound = args
+        if uuid not in registry:
+            objects[uuid] = lookup(owner).create_reference(
+                name, resolve(type_), containment=containment,
+                opposite=resolve(opposite), lower_bound=lower_bound,
+                upper_bound=upper_bound, uuid=uuid)
+    elif op == 'set':
+        attr, value = args
+        if attr in REFERENCE_ATTRIBUTES:
+            value = resolve(value)
+        obj = lookup(uuid)
+        if getattr(obj, attr) is not value and \
+                getattr(obj, attr) != value:
+            setattr(obj, attr, value)
+    elif op == 'move':
+        _move(lookup(uuid), args[0] and lookup(args[0]))
+    elif op == 'super':
+        model, super_model = lookup(uuid), lookup(args[0])
+        if args[1] and super_model not in model.super_models:
+            model.add_super_model(super_model)
+        elif not args[1]:
+            model.remove_super_model(super_model)
+    elif op == 'delete':
+        objects.pop(uuid, None)
+
+
+def _move(obj, owner):
+    from morpy.core import Model, Property
+    if obj.owner is owner:
+        return
+    if isinstance(obj, Model):
+        if owner is None:
+            obj.owner.remove_model(obj)
+        else:
+            owner.add_model(obj)
+    elif isinstance(obj, Property):
+        if owner is None:
+            obj.owner.remove_property(obj)
+        else:
+            owner.add_property(obj)
+    else:
+        if owner is None:
+            obj.owner.remove_reference(obj)
+        else:
+            owner.add_reference(obj)
@@ -1,5 +1,7 @@
 """
 """
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
 
 class AbstractRepository(object):
@@ -28,3 +30,128 @@ class AbstractRepository(object):
 
     # Inheriting classes should implement following methods
 
+    def load(self, name):
+        """
+        Loads and returns the mogram with the given name.
+        """
+        raise NotImplementedError
+
+    def save(self, mogram):
+        """
+        Stores the given mogram.
+        """
+        raise NotImplementedError
+
+    def fetch_by_uuid(self, uuid):
+        """
+        Returns the stored object with the given UUID.
+        """
+        raise NotImplementedError
+
+    def fetch_many(self, uuids):
+        """
+        Returns a dict of stored objects by UUID. Repositories that can fetch
+        many objects in a single request should override this.
+        """
+        return dict((uuid, self.fetch_by_uuid(uuid)) for uuid in uuids)
+
+
+class AsyncRepository(object):
+    """
+    Asyncio interface to a repository.
+
+    Blocking repository calls run in a bounded pool of worker threads so
+    the event loop is never blocked. Fetches requested in the same event
+    loop iteration are batched into a single fetch_many call and concurrent
+    requests for the same UUID, or loads of the same mogram, share one
+    call.
+
+    Usage:
+
+        async with AsyncRepository(repository, max_workers=4) as repo:
+            mogram = await repo.load('MyMogram')
+    """
+    def __init__(self, repository, max_workers=4, max_batch=1000):
+        self.repository = repository
+        self.max_batch = max_batch
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        # Fetches waiting for the next batch and fetches in progress.
+        self._pending = {}
+        self._in_progress = {}
+        self._loads = {}
+
+    async def load(self, name):
+        """
+        Loads the mogram with the given name.
+        """
+        future = self._loads.get(name)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(
+                self._executor, self.repository.load, name)
+            self._loads[name] = future
+            future.add_done_callback(lambda f: self._loads.pop(name, None))
+        # Cancellation of one waiter must not cancel the shared call.
+        return await asyncio.shield(future)
+
+    async def save(self, mogram):
+        """
+        Saves the given mogram.
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, self.repository.save, mogram)
+
+    async def fetch_by_uuid(self, uuid):
+        """
+        Returns the stored object with the given UUID or None if it doesn't
+        exist.
+        """
+        future = self._in_progress.get(uuid) or self._pending.get(uuid)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            if not self._pending:
+                loop.call_soon(self._flush)
+            future = self._pending[uuid] = loop.create_future()
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        pending = self._pending
+        self._pending = {}
+        self._in_progress.update(pending)
+        uuids = list(pending)
+        loop = asyncio.get_running_loop()
+        for start in range(0, len(uuids), self.max_batch):
+            batch = uuids[start:start + self.max_batch]
+            fetch = loop.run_in_executor(self._executor,
+                                         self.repository.fetch_many, batch)
+            fetch.add_done_callback(
+                lambda f, batch=batch: self._complete(batch, f))
+
+    def _complete(self, batch, fetch):
+        # The fetch is cancelled e.g. if the executor is shut down before
+        # it starts. Its waiters are cancelled too.
+        cancelled = fetch.cancelled()
+        exception = None if cancelled else fetch.exception()
+        objs = fetch.result() if not cancelled and exception is None \
+            else None
+        for uuid in batch:
+            future = self._in_progress.pop(uuid)
+            if future.done():
+                continue
+            if cancelled:
+                future.cancel()
+            elif exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(objs.get(uuid))
+
+    def close(self):
+        """
+        Shuts down worker threads.
+        """
+        self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,128 @@
+#-*- coding: utf-8 -*-
+#######################################################################
+# Name: stats.py
+# Purpose: Opt-in instrumentation of MoRP hot paths
+# Author: Igor R. Dejanovic <igor DOT dejanovic AT gmail DOT com>
+# Copyright: (c) 2013 Igor R. Dejanovic <igor DOT dejanovic AT gmail DOT com>
+# License: MIT License
+#######################################################################
+'''
+Instrumentation is disabled by default. Hot paths check the module level
+`collector` and do nothing more if it is None. Use
+Workspace().enable_stats() to install a collector.
+'''
+import logging
+from collections import defaultdict
+
+# Active Statistics instance or None if instrumentation is disabled.
+collector = None
+
+
+class Statistics(object):
+    '''
+    Collects counters and timings of MoRP operations.
+
+    Attributes:
+        sink(callable): Called with an event dict for each timed operation
+            whose elapsed time is at least `slow_threshold`.
+        slow_threshold(float): Minimal elapsed time in seconds for an event
+            to be passed to the sink. If None all events are passed.
+    '''
+    def __init__(self, sink=None, slow_threshold=None):
+        self.sink = sink
+        self.slow_threshold = slow_threshold
+        self.reset()
+
+    def reset(self):
+        '''
+        Clears all collected data.
+        '''
+        self.calls = defaultdict(int)
+        self.time = defaultdict(float)
+        self.visited = defaultdict(int)
+        self.max_time = defaultdict(float)
+        self.cache_hits = defaultdict(int)
+        self.cache_misses = defaultdict(int)
+        self.created = defaultdict(int)
+
+    def record_query(self, operation, key, elapsed, visited):
+        '''
+        Records a single lookup operation.
+        Args:
+            operation(string): Name of the operation, e.g. 'by_name'.
+            key: The value searched for.
+            elapsed(float): Elapsed time in seconds.
+            visited(int): Number of objects visited during the search.
+        '''
+        self.calls[operation] += 1
+        self.time[operation] += elapsed
+        self.visited[operation] += visited
+        if elapsed > self.max_time[operation]:
+            self.max_time[operation] = elapsed
+        if self.sink is not None and (self.slow_threshold is None
+                                      or elapsed >= self.slow_threshold):
+            self.sink({
+                'operation': operation,
+                'key': key,
+                'elapsed': elapsed,
+                'visited': visited,
+            })
+
+    def record_cache(self, cache, hit):
+        '''
+        Records a cache access.
+        Args:
+            cache(string): Name of the cache.
+            hit(bool): True for a cache hit, False for a miss.
+        '''
+        if hit:
+            self.cache_hits[cache] += 1
+        else:
+            self.cache_misses[cache] += 1
+
+    def record_created(self, obj):
+        '''
+        Records creation of a MoRP object.
+        '''
+        meta = obj.meta
+        self.created[getattr(meta, 'name', None) or str(meta)] += 1
+
+    def snapshot(self):
+        '''
+        Returns collected data as a dict of plain values.
+        '''
+        operations = {}
+        for operation, calls in self.calls.items():
+            operations[operation] = {
+                'calls': calls,
+                'time': self.time[operation],
+                'max_time': self.max_time[operation],
+                'mean_time': self.time[operation] / calls,
+                'visited': self.visited[operation],
+                'mean_visited': self.visited[operation] / float(calls),
+            }
+        caches = {}
+        for cache in set(self.cache_hits) | set(self.cache_misses):
+            caches[cache] = {
+                'hits': self.cache_hits[cache],
+                'misses': self.cache_misses[cache],
+            }
+        return {
+            'operations': operations,
+            'caches': caches,
+            'created': dict(self.created),
+        }
+
+
+class LoggingSink(object):
+    '''
+    Statistics sink that logs each event.
+    '''
+    def __init__(self, logger=None, level=logging.WARNING):
+        self.logger = logger or logging.getLogger('morpy.stats')
+        self.level = level
+
+    def __call__(self, event):
+        self.logger.log(self.level,
+                        "%(operation)s(%(key)r) took %(elapsed).6fs, "
+                        "visited %(visited)d objects", event)
@@ -0,0 +1,476 @@
+#-*- coding: utf-8 -*-
+###############################################################################
+# Name: bench_core.py
+# Purpose: Benchmarks of the core meta-modelling operations.
+# Author: Igor R. Dejanović <igor DOT dejanovic AT gmail DOT com>
+# Copyright: (c) 2013 Igor R. Dejanović <igor DOT dejanovic AT gmail DOT com>
+# License: MIT License
+###############################################################################
+'''
+Benchmarks of the core MoRPy operations over synthetic mograms.
+
+Run as:
+
+    python -m morpy_bench.bench_core --sizes 1000,10000,100000,1000000 \
+        --output results.json
+
+Results are written as JSON so that runs for different commits can be
+compared with:
+
+    python -m morpy_bench.bench_core --compare old.json new.json
+'''
+import argparse
+import gc
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import deque
+
+from morpy import Workspace
+from morpy.const import MORP, UUID_PRIMITIVE_TYPES_STRING
+from morpy.core import MoRPContainer, Mogram
+
+# Mogram shapes given as (name, fan-out, depth).
+SHAPES = [
+    ('wide', 100, 2),
+    ('balanced', 10, 4),
+    ('deep', 3, 12),
+]
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+
+def build_mogram(name, size, fanout, depth, mogram=None):
+    '''
+    Creates a synthetic mogram with exactly `size` models.
+    Models are created breadth-first, each container receiving at most
+    `fanout` inner models, down to `depth` levels. When the depth limit is
+    reached the mogram itself receives further top-level models.
+    Args:
+        mogram(Mogram): Mogram to fill. If not given a new mogram is
+            created in the workspace.
+    Returns:
+        A tuple (mogram, list of created models in creation order).
+    '''
+    if mogram is None:
+        mogram = Workspace().create_mogram(name, MORP)
+    models = []
+    queue = deque()
+    while len(models) < size:
+        if not queue:
+            queue.append((mogram, 0))
+        container, level = queue.popleft()
+        for _ in range(fanout):
+            if len(models) == size:
+                break
+            model = container.create_model('M%d' % len(models))
+            models.append(model)
+            if level + 1 < depth:
+                queue.append((model, level + 1))
+    return mogram, models
+
+
+class Timer(object):
+    '''
+    Collects benchmark results.
+    '''
+    def __init__(self):
+        self.results = []
+
+    def measure(self, operation, params, func, calls=1):
+        '''
+        Calls `func` once and records the elapsed time for `calls`
+        operations performed by it.
+        '''
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        result = dict(params)
+        result.update({
+            'operation': operation,
+            'calls': calls,
+            'total_s': elapsed,
+            'per_call_s': elapsed / calls if calls else 0.0,
+        })
+        self.results.append(result)
+        print('%-22s %-40s %10.6f s/call' % (
+            operation, _format_params(params), result['per_call_s']),
+            file=sys.stderr)
+        return result
+
+
+def _format_params(params):
+    return ' '.join('%s=%s' % (k, params[k]) for k in sorted(params))
+
+
+def bench_bootstrap(timer, repeat=5):
+    '''
+    Measures bootstrapping of the MoRP language.
+    Note: re-creates MoRP objects in the workspace so it must run before
+    any other benchmark.
+    '''
+    workspace = Workspace()
+
+    def run():
+        for _ in range(repeat):
+            # Each bootstrap catalogs a new MoRP mogram. The replaced one
+            # is removed so that the workspace is left with a single one.
+            replaced = workspace.morp
+            workspace.create_MoRP()
+            workspace.remove_mogram(replaced)
+    timer.measure('create_MoRP', {}, run, calls=repeat)
+
+
+def bench_shape(timer, size, shape, lookups=10, seed=0):
+    '''
+    Runs all benchmarks for the mogram of the given size and shape.
+    '''
+    shape_name, fanout, depth = shape
+    params = {'size': size, 'shape': shape_name, 'fanout': fanout,
+              'depth': depth}
+    rnd = random.Random(seed)
+    name = 'bench_%s_%d_%d' % (shape_name, size, len(timer.results))
+
+    built = {}
+
+    def create():
+        built['mogram'], built['models'] = build_mogram(name, size, fanout,
+                                                        depth)
+    timer.measure('create_model', params, create, calls=size)
+    mogram, models = built['mogram'], built['models']
+
+    def clone():
+        built['clone'] = mogram.clone()
+    timer.measure('clone_mogram', params, clone, calls=size)
+    del built['clone']
+
+    # Lookups of random models and of the last created one
+    # (worst case for depth-first search).
+    targets = [rnd.choice(models) for _ in range(lookups - 1)] + [models[-1]]
+
+    def by_name():
+        for target in targets:
+            assert mogram.by_name(target.name) is target
+    timer.measure('by_name', params, by_name, calls=len(targets))
+
+    def by_uuid():
+        for target in targets:
+            assert mogram.by_uuid(target.uuid) is target
+    timer.measure('by_uuid', params, by_uuid, calls=len(targets))
+
+    toplevel = list(mogram.contents)
+    contains_targets = [rnd.choice(toplevel) for _ in range(lookups - 1)] \
+        + [toplevel[-1]]
+
+    def contains_model():
+        for target in contains_targets:
+            assert target in mogram
+    timer.measure('contains_model', params, contains_model,
+                  calls=len(contains_targets))
+
+    def contains_name():
+        for target in contains_targets:
+            assert target.name in mogram
+    timer.measure('contains_name', params, contains_name,
+                  calls=len(contains_targets))
+
+    flat = MoRPContainer(models)
+    meta = Workspace().model
+
+    def by_meta():
+        assert len(flat.by_meta(meta)) == size
+    timer.measure('by_meta', params, by_meta, calls=1)
+
+    def by_meta_name():
+        assert len(flat.by_meta(meta.name)) == size
+    timer.measure('by_meta_name', params, by_meta_name, calls=1)
+
+    def filter_():
+        assert len(flat.filter(lambda m: not m.abstract)) == size
+    timer.measure('filter', params, filter_, calls=1)
+
+    # All models inherit a single base model, which gives a base with
+    # `size` inherited models.
+    base = mogram.create_model('Base', abstract=True)
+
+    def add_super_model():
+        for model in models:
+            model.add_super_model(base)
+    timer.measure('add_super_model', params, add_super_model, calls=size)
+
+    # Removal scans start from the front of the collections so removing
+    # in reverse creation order is the worst case for list based
+    # collections.
+    def remove_super_model():
+        for model in reversed(models):
+            model.remove_super_model(base)
+    timer.measure('remove_super_model', params, remove_super_model,
+                  calls=size)
+
+    # Move all models to a single container. Target then holds models in
+    # reverse creation order so removing them in creation order always
+    # removes the last one.
+    target = mogram.create_model('Target')
+
+    def move_model():
+        for model in reversed(models):
+            target.add_model(model)
+    timer.measure('move_model', params, move_model, calls=size)
+
+    def remove_model():
+        for model in models:
+            target.remove_model(model)
+    timer.measure('remove_model', params, remove_model, calls=size)
+
+
+class GCMonitor(object):
+    '''
+    Records durations of cyclic garbage collector runs.
+    '''
+    def __init__(self):
+        self.pauses = []
+        self._start = None
+
+    def __call__(self, phase, info):
+        if phase == 'start':
+            self._start = time.perf_counter()
+        elif self._start is not None:
+            self.pauses.append(time.perf_counter() - self._start)
+            self._start = None
+
+    def __enter__(self):
+        gc.callbacks.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        gc.callbacks.remove(self)
+
+
+def bench_gc(timer, size, shape):
+    '''
+    Measures garbage collector pauses while a mogram with inheritance and
+    bidirectional references is built and fully collected, and checks
+    that dropping the mogram frees it by reference counting alone.
+    '''
+    shape_name, fanout, depth = shape
+    params = {'size': size, 'shape': shape_name, 'fanout': fanout,
+              'depth': depth}
+    gc.collect()
+    registered = len(Workspace().by_uuid)
+
+    built = {}
+
+    def build():
+        mogram = Mogram('bench_gc', conforms_to=Workspace().morp)
+        _, models = build_mogram(None, size, fanout, depth, mogram=mogram)
+        base = mogram.create_model('Base', abstract=True)
+        # Types are strong references. Recursive types would form cycles.
+        target = mogram.create_model('Target')
+        previous = base.create_reference('next', target)
+        for model in models:
+            model.add_super_model(base)
+            previous = model.create_reference('next', target,
+                                              opposite=previous)
+        built['mogram'] = mogram
+
+    with GCMonitor() as monitor:
+        timer.measure('gc_build', params, build, calls=size)
+    pauses = monitor.pauses
+
+    with GCMonitor() as monitor:
+        timer.measure('gc_collect', params, gc.collect, calls=1)
+    pauses = pauses + monitor.pauses
+
+    for operation, value in [('gc_pause_max', max(pauses or [0.0])),
+                             ('gc_pause_total', sum(pauses))]:
+        result = dict(params, operation=operation, calls=1, total_s=value,
+                      per_call_s=value)
+        timer.results.append(result)
+        print('%-22s %-40s %10.6f s' % (operation, _format_params(params),
+                                        value), file=sys.stderr)
+
+    def drop():
+        gc.disable()
+        try:
+            del built['mogram']
+            # Everything must be freed without the cyclic collector.
+            assert len(Workspace().by_uuid) == registered, \
+                'Mogram is not freed by reference counting.'
+        finally:
+            gc.enable()
+    timer.measure('gc_drop', params, drop, calls=size)
+
+
+def bench_migration(timer, size):
+    '''
+    Measures a change of a model with many instances and the lazy
+    migration of the instances afterwards.
+    '''
+    from morpy.const import UUID_PRIMITIVE_TYPES_INTEGER
+    from morpy.migration import migrate_batches, register_migration
+    params = {'size': size}
+    integer = Workspace().get_by_uuid(UUID_PRIMITIVE_TYPES_INTEGER)
+    mogram = Mogram('bench_migration', conforms_to=Workspace().morp)
+    model = mogram.create_model('Person')
+    model.create_property('age', integer)
+    instances = [model.create_instance(age=i) for i in range(size)]
+
+    def change():
+        model.create_property('adult', integer)
+        register_migration(
+            model, lambda values: values.update(adult=values['age'] >= 18))
+    timer.measure('meta_change', params, change, calls=1)
+
+    def migrate():
+        for _ in migrate_batches(model):
+            pass
+    timer.measure('migrate_batches', params, migrate, calls=size)
+    assert instances[-1].adult
+
+
+def bench_name_index(timer, size, lookups=10, seed=0):
+    '''
+    Measures building of the workspace name index and name completion
+    over a mogram with `size` models. Filtered completions use a small
+    mogram and a few properties sharing the prefix of all models so the
+    filters exclude almost all matches.
+    '''
+    params = {'size': size}
+    rnd = random.Random(seed)
+    workspace = Workspace()
+    string = workspace.get_by_uuid(UUID_PRIMITIVE_TYPES_STRING)
+    mogram, models = build_mogram('bench_index_%d' % size, size, 100, 3)
+    small, _ = build_mogram('bench_index_small_%d' % size, 10, 10, 1)
+    for model in rnd.sample(models, min(10, size)):
+        model.create_property('m_' + model.name, string)
+    workspace.drop_name_index()
+    timer.measure('name_index_build', params,
+                  lambda: workspace.name_index, calls=size)
+    name_index = workspace.name_index
+
+    prefixes = [rnd.choice(models).name[:4].lower() for _ in range(lookups)]
+
+    def complete():
+        for prefix in prefixes:
+            name_index.complete(prefix, mogram=mogram)
+    timer.measure('complete', params, complete, calls=len(prefixes))
+
+    def complete_mogram():
+        for _ in range(lookups):
+            name_index.complete('m', mogram=small)
+    timer.measure('complete_small_mogram', params, complete_mogram,
+                  calls=lookups)
+
+    def complete_meta():
+        for _ in range(lookups):
+            name_index.complete('m', meta=workspace.prop)
+    timer.measure('complete_meta', params, complete_meta, calls=lookups)
+
+    def rename():
+        for model in models[:lookups]:
+            model.name = model.name + 'x'
+    timer.measure('index_rename', params, rename, calls=lookups)
+    workspace.drop_name_index()
+    workspace.remove_mogram(mogram)
+    workspace.remove_mogram(small)
+
+
+def git_revision():
+    '''
+    Returns current git revision or None if not available.
+    '''
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes, shapes, lookups=10, seed=0):
+    '''
+    Runs the benchmark suite and returns results as a dict ready for JSON
+    serialization.
+    '''
+    timer = Timer()
+    bench_bootstrap(timer)
+    for size in sizes:
+        for shape in shapes:
+            bench_shape(timer, size, shape, lookups=lookups, seed=seed)
+            bench_gc(timer, size, shape)
+        bench_migration(timer, size)
+        bench_name_index(timer, size, lookups=lookups, seed=seed)
+    return {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': timer.results,
+    }
+
+
+def _result_key(result):
+    return (result['operation'], result.get('shape', ''),
+            result.get('size', 0))
+
+
+def compare(old, new):
+    '''
+    Prints per-call time ratio new/old for each benchmark present in both
+    result sets.
+    '''
+    old_results = dict((_result_key(r), r) for r in old['results'])
+    print('%-22s %-10s %10s %14s %14s %8s' % (
+        'operation', 'shape', 'size', 'old s/call', 'new s/call', 'ratio'))
+    for result in new['results']:
+        key = _result_key(result)
+        if key not in old_results:
+            continue
+        old_time = old_results[key]['per_call_s']
+        new_time = result['per_call_s']
+        ratio = new_time / old_time if old_time else float('inf')
+        print('%-22s %-10s %10s %14.8f %14.8f %8.2f' % (
+            key + (old_time, new_time, ratio)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='MoRPy core benchmarks.')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='Comma separated list of mogram sizes.')
+    parser.add_argument('--shapes', default=','.join(s[0] for s in SHAPES),
+                        help='Comma separated list of shapes (%s).' %
+                        ', '.join(s[0] for s in SHAPES))
+    parser.add_argument('--lookups', type=int, default=10,
+                        help='Number of lookups per lookup benchmark.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSON output file (default stdout).')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='Compare two JSON result files.')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as old, open(args.compare[1]) as new:
+            compare(json.load(old), json.load(new))
+        return
+
+    sizes = [int(float(s)) for s in args.sizes.split(',')]
+    shape_names = args.shapes.split(',')
+    shapes = [s for s in SHAPES if s[0] in shape_names]
+
+    # Deep containment trees are searched recursively.
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+
+    results = run(sizes, shapes, lookups=args.lookups, seed=args.seed)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
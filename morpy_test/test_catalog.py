@@ -0,0 +1,102 @@
+#-*- coding: utf-8 -*-
+###############################################################################
+# Name: test_catalog.py
+# Purpose: Testing workspace mogram catalog.
+# Author: Igor R. Dejanović <igor DOT dejanovic AT gmail DOT com>
+# Copyright: (c) 2013 Igor R. Dejanović <igor DOT dejanovic AT gmail DOT com>
+# License: MIT License
+###############################################################################
+
+import unittest
+from morpy import Workspace
+from morpy.const import MORP
+from morpy.core import Mogram
+from morpy.exceptions import MogramExists
+
+
+class CatalogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = Workspace().catalog
+        self.language = Workspace().create_language(self.id())
+        self.other = Workspace().create_language(self.id() + 'Other')
+        self.name = self.id() + 'Mogram'
+        self.mogram = Workspace().create_mogram(self.name, self.language)
+
+    def test_lookup(self):
+        self.assertIs(Workspace().mograms[self.name], self.mogram)
+        self.assertIs(self.catalog.get(self.name), self.mogram)
+        self.assertIn(self.name, self.catalog)
+        self.assertIn(self.mogram, self.catalog)
+        self.assertIn(self.mogram.uuid, self.catalog.uuids)
+        self.assertRaises(MogramExists, Workspace().create_mogram, self.name,
+                          self.other)
+
+        second = Workspace().create_mogram(self.name + '2', self.language)
+        self.assertEqual(self.catalog.conforming_to(self.language),
+                         [self.mogram, second])
+        # Language may be given by name or abstract syntax.
+        self.assertEqual(self.catalog.conforming_to(self.language.name),
+                         [self.mogram, second])
+        self.assertEqual(
+            self.catalog.conforming_to(self.language.abstract_syntax),
+            [self.mogram, second])
+        self.assertEqual(self.catalog.conforming_to(self.other), [])
+
+        # Abstract syntaxes conform to MoRP.
+        self.assertIn(self.language.abstract_syntax,
+                      self.catalog.conforming_to(MORP))
+        self.assertEqual(self.catalog.of_language(self.language),
+                         [self.language.abstract_syntax])
+
+    def test_reindexing(self):
+        self.mogram.conforms_to = self.other
+        self.assertEqual(self.catalog.conforming_to(self.language), [])
+        self.assertEqual(self.catalog.conforming_to(self.other),
+                         [self.mogram])
+
+        self.mogram.name = self.name + 'Renamed'
+        self.assertNotIn(self.name, self.catalog)
+        self.assertIs(self.catalog.get(self.name + 'Renamed'), self.mogram)
+
+        Workspace().create_mogram(self.name, self.other)
+        log = Workspace().enable_oplog()
+        try:
+            with self.assertRaises(MogramExists):
+                self.mogram.name = self.name
+        finally:
+            Workspace().disable_oplog()
+        self.assertEqual(self.mogram.name, self.name + 'Renamed')
+        self.assertIs(self.catalog.get(self.name + 'Renamed'), self.mogram)
+        # Rejected rename is not replicated.
+        self.assertEqual(log.entries, [])
+
+    def test_language_mograms(self):
+        generator = Workspace().create_mogram(self.id() + 'Generator', MORP)
+        self.language.add_generator(generator)
+        editor = Mogram(self.id() + 'Editor', conforms_to=MORP)
+        self.language.add_concrete_syntax(editor)
+
+        self.assertIs(generator.language, self.language)
+        self.assertEqual(self.language.generators, [generator])
+        self.assertEqual(self.language.concrete_syntaxes, [editor])
+        self.assertNotIn(generator.name, self.catalog)
+        self.assertEqual(self.catalog.of_language(self.language),
+                         [self.language.abstract_syntax, generator, editor])
+
+        Workspace().remove_mogram(generator)
+        self.assertEqual(self.language.generators, [])
+        self.assertNotIn(generator, self.catalog)
+        self.assertEqual(self.catalog.of_language(self.language),
+                         [self.language.abstract_syntax, editor])
+
+    def test_remove(self):
+        Workspace().remove_mogram(self.name)
+        self.assertNotIn(self.mogram, self.catalog)
+        self.assertEqual(self.catalog.conforming_to(self.language), [])
+        # Name can be reused.
+        Workspace().create_mogram(self.name, self.language)
+
+
+if __name__ == "__main__":
+    unittest.main()
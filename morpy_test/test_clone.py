@@ -0,0 +1,137 @@
+#-*- coding: utf-8 -*-
+###############################################################################
+# Name: test_clone.py
+# Purpose: Testing cloning of mograms and models.
+# Author: Igor R. Dejanović <igor DOT dejanovic AT gmail DOT com>
+# Copyright: (c) 2013 Igor R. Dejanović <igor DOT dejanovic AT gmail DOT com>
+# License: MIT License
+###############################################################################
+
+import unittest
+from morpy import Workspace
+from morpy.const import UUID_PRIMITIVE_TYPES_INTEGER
+from morpy.replication import apply_delta
+from morpy_test.test_replication import describe
+
+
+class CloneTest(unittest.TestCase):
+
+    def setUp(self):
+        integer = Workspace().get_by_uuid(UUID_PRIMITIVE_TYPES_INTEGER)
+        self.language = Workspace().create_language(self.id())
+        self.base = Workspace().create_mogram(self.id() + 'Base',
+                                              self.language)
+        self.external = self.base.create_model('External')
+        self.mogram = Workspace().create_mogram(self.id() + 'Mogram',
+                                                self.language)
+        self.named = self.mogram.create_model('Named', abstract=True)
+        self.person = self.mogram.create_model('Person')
+        self.person.add_super_model(self.named)
+        self.person.add_super_model(self.external)
+        self.age = self.person.create_property('age', integer)
+        self.company = self.mogram.create_model('Company')
+        self.employees = self.company.create_reference(
+            'employees', self.person, upper_bound=-1)
+        self.employer = self.person.create_reference(
+            'employer', self.company, opposite=self.employees)
+        self.person.create_model('Address')
+
+    def structure(self, container):
+        '''
+        Returns description of the container with UUIDs replaced by names.
+        '''
+        names = {}
+        stack = [container]
+        while stack:
+            obj = stack.pop()
+            names[obj.uuid] = obj.name
+            if hasattr(obj, 'properties'):
+                for feature in obj.properties + obj.references:
+                    names[feature.uuid] = feature.name
+                for model in obj.super_models:
+                    names[model.uuid] = model.name
+            stack.extend(obj.contents)
+
+        def replace(value):
+            if isinstance(value, list):
+                return [replace(v) for v in value]
+            return names.get(value, value)
+        return replace(describe(container))
+
+    def test_mogram_clone(self):
+        clone = self.mogram.clone(name='Copy')
+        self.assertEqual(clone.name, 'Copy')
+        self.assertIs(clone.conforms_to, self.language)
+        self.assertIsNone(clone.language)
+        self.assertEqual(self.structure(clone)[2:],
+                         self.structure(self.mogram)[2:])
+
+        person = clone.by_name('Person')
+        company = clone.by_name('Company')
+        self.assertIsNot(person, self.person)
+        self.assertNotEqual(person.uuid, self.person.uuid)
+        self.assertIs(Workspace().get_by_uuid(person.uuid), person)
+        self.assertIs(person.owner, clone)
+        self.assertIs(person.properties[0].owner, person)
+
+        # Internal references are rewired, external ones are kept.
+        named = clone.by_name('Named')
+        self.assertEqual(person.super_models, [named, self.external])
+        self.assertEqual(named.inherited_models, [person])
+        self.assertEqual(self.external.inherited_models,
+                         [self.person, person])
+        employer = person.references[0]
+        self.assertIs(employer.type, company)
+        self.assertIs(employer.opposite, company.references[0])
+        self.assertIs(company.references[0].opposite, employer)
+        self.assertIs(person.properties[0].type, self.age.type)
+
+        # Original is not changed.
+        self.assertEqual(self.named.inherited_models, [self.person])
+        self.assertIs(self.employer.opposite, self.employees)
+
+        # Copies are independent of originals.
+        self.assertNotEqual(clone.content_hash, self.mogram.content_hash)
+        original_hash = self.mogram.content_hash
+        person.name = 'Other'
+        self.assertEqual(self.mogram.content_hash, original_hash)
+        self.assertEqual(self.person.name, 'Person')
+
+    def test_model_clone(self):
+        clone = self.person.clone(owner=self.company)
+        self.assertIs(clone.owner, self.company)
+        self.assertIn(clone, self.company)
+        self.assertEqual(clone.by_name('Address').owner, clone)
+        # Reference to the model outside of the cloned subtree is kept.
+        self.assertIs(clone.references[0].type, self.company)
+        # Opposite outside of the cloned subtree stays paired with the
+        # original.
+        self.assertIsNone(clone.references[0].opposite)
+        self.assertIs(self.employees.opposite, self.employer)
+        self.assertEqual(clone.super_models, [self.named, self.external])
+        self.assertIn(clone, self.named.inherited_models)
+
+    def test_replication(self):
+        log = Workspace().enable_oplog()
+        try:
+            clone = self.mogram.clone(name=self.id() + 'Copy')
+            entries = list(log.entries)
+        finally:
+            Workspace().disable_oplog()
+
+        # Replay in this workspace with UUIDs of the original objects
+        # replaced by fresh ones.
+        replaced = {}
+        delta = log.export_delta(0).decode('utf-8')
+        for obj_uuid in set(e[2] for e in entries):
+            replaced[obj_uuid] = obj_uuid[::-1]
+            delta = delta.replace(obj_uuid, replaced[obj_uuid])
+        delta = delta.replace(self.id() + 'Copy', self.id() + 'Replica')
+        apply_delta(delta.encode('utf-8'), {})
+        replica = Workspace().get_by_uuid(replaced[clone.uuid])
+        self.assertEqual(self.structure(replica)[2:],
+                         self.structure(clone)[2:])
+
+
+if __name__ == "__main__":
+    unittest.main()
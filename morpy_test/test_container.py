@@ -0,0 +1,166 @@
+#-*- coding: utf-8 -*-
+###############################################################################
+# Name: test_container.py
+# Purpose: Testing MoRP containers.
+# Author: Igor R. Dejanović <igor DOT dejanovic AT gmail DOT com>
+# Copyright: (c) 2013 Igor R. Dejanović <igor DOT dejanovic AT gmail DOT com>
+# License: MIT License
+###############################################################################
+
+from collections.abc import MutableSequence
+import gc
+import unittest
+from morpy import Workspace
+from morpy.const import MORP
+from morpy.core import Model, MoRPContainer, Mogram, WeakMoRPContainer
+
+
+class Item(object):
+    pass
+
+
+class ContainerTest(unittest.TestCase):
+
+    container_class = MoRPContainer
+
+    def test_list_api(self):
+        a, b, c = Item(), Item(), Item()
+        container = self.container_class([a, b])
+        container.append(c)
+        self.assertEqual(container, [a, b, c])
+        self.assertEqual(len(container), 3)
+        self.assertIs(container[0], a)
+        self.assertIs(container[-1], c)
+        self.assertEqual(container[1:], [b, c])
+        self.assertEqual(list(reversed(container)), [c, b, a])
+        self.assertEqual(container.index(b), 1)
+        self.assertIn(b, container)
+
+        # Appending contained object moves it to the end.
+        container.append(a)
+        self.assertEqual(container, [b, c, a])
+
+        container.remove(c)
+        self.assertEqual(container, [b, a])
+        self.assertRaises(ValueError, container.remove, c)
+
+        container.insert(0, c)
+        self.assertEqual(container, [c, b, a])
+        self.assertIs(container.pop(), a)
+        self.assertIs(container.pop(0), c)
+        self.assertEqual(container, [b])
+
+    def test_list_changes(self):
+        a, b, c, d = Item(), Item(), Item(), Item()
+        container = self.container_class([a, b])
+        self.assertIsInstance(container, MutableSequence)
+        self.assertEqual(container + [c], [a, b, c])
+        self.assertEqual([c] + container, [c, a, b])
+        self.assertEqual(container, [a, b])
+
+        extended = container
+        extended += [c]
+        self.assertIs(extended, container)
+        self.assertEqual(container, [a, b, c])
+
+        container[1] = d
+        self.assertEqual(container, [a, d, c])
+        del container[0]
+        self.assertEqual(container, [d, c])
+        container[0:1] = [a, b]
+        self.assertEqual(container, [a, b, c])
+        del container[1:]
+        self.assertEqual(container, [a])
+
+        # Assigned object contained elsewhere is moved.
+        container.extend([b, c])
+        container[0] = c
+        self.assertEqual(container, [b, c])
+
+        container.reverse()
+        self.assertEqual(container, [c, b])
+        order = [b, c]
+        container.sort(key=order.index)
+        self.assertEqual(container, [b, c])
+        container.sort(key=order.index, reverse=True)
+        self.assertEqual(container, [c, b])
+
+    def test_contents_move_and_remove(self):
+        mogram = Workspace().create_mogram(self.id(), MORP)
+        first = mogram.create_model('First')
+        second = mogram.create_model('Second')
+        inner = first.create_model('Inner')
+        self.assertEqual(mogram.contents, [first, second])
+
+        second.add_model(inner)
+        self.assertNotIn(inner, first)
+        self.assertEqual(second.contents, [inner])
+        self.assertIs(inner.owner, second)
+
+        mogram.remove_model(first)
+        self.assertEqual(mogram.contents, [second])
+        self.assertIsNone(first.owner)
+
+    def test_super_models(self):
+        mogram = Workspace().create_mogram(self.id(), MORP)
+        base = mogram.create_model('Base', abstract=True)
+        derived = mogram.create_model('Derived')
+        derived.add_super_model(base)
+        self.assertEqual(derived.super_models, [base])
+        self.assertEqual(base.inherited_models, [derived])
+
+        derived.remove_super_model(base)
+        self.assertEqual(len(derived.super_models), 0)
+        self.assertEqual(len(base.inherited_models), 0)
+
+    def test_freed_by_reference_counting(self):
+        mogram = Mogram('Freed', conforms_to=Workspace().morp)
+        base = mogram.create_model('Base', abstract=True)
+        node = mogram.create_model('Node')
+        node.add_super_model(base)
+        inner = node.create_model('Inner')
+        children = node.create_reference('children', inner, containment=True)
+        inner.create_reference('parent', base, opposite=children)
+        uuids = [mogram.uuid, base.uuid, node.uuid, children.uuid]
+        del base, node, inner, children
+
+        gc.disable()
+        try:
+            del mogram
+            for uuid in uuids:
+                self.assertNotIn(uuid, Workspace().by_uuid)
+        finally:
+            gc.enable()
+
+    def test_recursive_type(self):
+        mogram = Mogram('Recursive', conforms_to=Workspace().morp)
+        node = mogram.create_model('Node')
+        node.create_reference('children', node, containment=True)
+        uuid = node.uuid
+        del node
+
+        # Types are strong so the reference is valid while the mogram
+        # exists. The cycle is freed by the cyclic garbage collector.
+        self.assertIs(mogram.by_name('Node').references[0].type,
+                      mogram.by_name('Node'))
+        del mogram
+        gc.collect()
+        self.assertNotIn(uuid, Workspace().by_uuid)
+
+    def test_type_outlives_owner(self):
+        mogram = Mogram('Types', conforms_to=Workspace().morp)
+        reference = mogram.create_model('A').create_reference(
+            'x', Model('Standalone'))
+        self.assertEqual(reference.type.name, 'Standalone')
+
+
+class WeakContainerTest(ContainerTest):
+
+    container_class = WeakMoRPContainer
+
+    def test_weak_references(self):
+        a, b = Item(), Item()
+        container = WeakMoRPContainer([a, b])
+        del a
+        self.assertEqual(container, [b])
+        self.assertEqual(len(container), 1)
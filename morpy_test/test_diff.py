@@ -0,0 +1,168 @@
+#-*- coding: utf-8 -*-
+###############################################################################
+# Name: test_diff.py
+# Purpose: Testing diff and merge of mograms.
+# Author: Igor R. Dejanović <igor DOT dejanovic AT gmail DOT com>
+# Copyright: (c) 2013 Igor R. Dejanović <igor DOT dejanovic AT gmail DOT com>
+# License: MIT License
+###############################################################################
+
+import unittest
+from morpy import Workspace
+from morpy.const import MORP, UUID_PRIMITIVE_TYPES_INTEGER, \
+    UUID_PRIMITIVE_TYPES_STRING
+from morpy.core import Model
+from morpy.diff import diff, merge, ADDED, REMOVED, MOVED, RENAMED, \
+    RETYPED, CHANGED
+
+
+def build_version(name):
+    '''
+    Builds a version of the test mogram. All versions share UUIDs.
+    '''
+    integer = Workspace().get_by_uuid(UUID_PRIMITIVE_TYPES_INTEGER)
+    mogram = Workspace().create_mogram(name, MORP)
+    person = Model('Person', owner=mogram, uuid='diff-person')
+    person.create_property('age', integer, uuid='diff-person-age')
+    address = Model('Address', owner=person, uuid='diff-address')
+    address.create_property('number', integer, uuid='diff-address-number')
+    company = Model('Company', owner=mogram, uuid='diff-company')
+    company.create_reference('employees', person, upper_bound=-1,
+                             uuid='diff-company-employees')
+    return mogram
+
+
+def summary(changes):
+    return sorted((c.kind, c.uuid, c.aspect) for c in changes)
+
+
+class DiffTest(unittest.TestCase):
+
+    def setUp(self):
+        self.base = build_version(self.id() + 'base')
+        self.new = build_version(self.id() + 'new')
+
+    def feature(self, mogram, model_uuid, uuid):
+        model = mogram.by_uuid(model_uuid)
+        return [f for f in model.properties + model.references
+                if f.uuid == uuid][0]
+
+    def test_equal(self):
+        self.assertEqual(diff(self.base, self.new), [])
+
+    def test_changes(self):
+        string = Workspace().get_by_uuid(UUID_PRIMITIVE_TYPES_STRING)
+        person = self.new.by_uuid('diff-person')
+        address = self.new.by_uuid('diff-address')
+        company = self.new.by_uuid('diff-company')
+        age = self.feature(self.new, 'diff-person', 'diff-person-age')
+
+        person.name = 'Employee'
+        age.type = string
+        company.abstract = True
+        company.add_model(address)
+        Model('Department', owner=company, uuid='diff-department')
+        person.remove_property(age)
+
+        self.assertEqual(summary(diff(self.base, self.new)), sorted([
+            (RENAMED, 'diff-person', 'name'),
+            (CHANGED, 'diff-company', 'abstract'),
+            (MOVED, 'diff-address', 'owner'),
+            (ADDED, 'diff-department', 'owner'),
+            (REMOVED, 'diff-person-age', 'owner'),
+        ]))
+
+    def test_retype_and_remove_subtree(self):
+        string = Workspace().get_by_uuid(UUID_PRIMITIVE_TYPES_STRING)
+        self.feature(self.new, 'diff-address',
+                     'diff-address-number').type = string
+        company = self.new.by_uuid('diff-company')
+        self.new.remove_model(company)
+
+        changes = diff(self.base, self.new)
+        self.assertEqual(summary(changes), sorted([
+            (RETYPED, 'diff-address-number', 'type'),
+            (REMOVED, 'diff-company', 'owner'),
+            (REMOVED, 'diff-company-employees', 'owner'),
+        ]))
+        retyped = [c for c in changes if c.kind == RETYPED][0]
+        self.assertEqual(retyped.new, UUID_PRIMITIVE_TYPES_STRING)
+
+
+class MergeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.base = build_version(self.id() + 'base')
+        self.ours = build_version(self.id() + 'ours')
+        self.theirs = build_version(self.id() + 'theirs')
+
+    def test_merge(self):
+        self.ours.by_uuid('diff-person').name = 'Employee'
+
+        theirs_company = self.theirs.by_uuid('diff-company')
+        theirs_company.add_model(self.theirs.by_uuid('diff-address'))
+        department = Model('Department', owner=theirs_company,
+                           uuid='diff-department')
+        department.add_super_model(self.theirs.by_uuid('diff-person'))
+
+        conflicts = merge(self.base, self.ours, self.theirs)
+        self.assertEqual(conflicts, [])
+
+        person = self.ours.by_uuid('diff-person')
+        company = self.ours.by_uuid('diff-company')
+        self.assertEqual(person.name, 'Employee')
+        self.assertIs(self.ours.by_uuid('diff-address').owner, company)
+        department = self.ours.by_uuid('diff-department')
+        self.assertIs(department.owner, company)
+        self.assertEqual(department.super_models, [person])
+
+        # Only our rename differs from their version now.
+        self.assertEqual(summary(diff(self.theirs, self.ours)),
+                         [(RENAMED, 'diff-person', 'name')])
+
+        # Their elements stay registered under their UUIDs.
+        self.assertIs(Workspace().get_by_uuid('diff-department'),
+                      self.theirs.by_uuid('diff-department'))
+
+    def test_feature_typed_by_added_model(self):
+        person = self.theirs.by_uuid('diff-person')
+        home = Model('Home', owner=person, uuid='diff-home')
+        person.create_reference('home', home, uuid='diff-person-home')
+        home.create_property('street', home, uuid='diff-home-street')
+
+        self.assertEqual(merge(self.base, self.ours, self.theirs), [])
+        person = self.ours.by_uuid('diff-person')
+        home = self.ours.by_uuid('diff-home')
+        self.assertIs(home.owner, person)
+        self.assertIs(person.references[0].type, home)
+        self.assertIs(home.properties[0].type, home)
+        self.assertEqual(diff(self.theirs, self.ours), [])
+
+    def test_missing_reference(self):
+        self.ours.remove_model(self.ours.by_uuid('diff-company'))
+        department = Model('Department', owner=self.theirs,
+                           uuid='diff-department')
+        department.add_super_model(self.theirs.by_uuid('diff-company'))
+
+        conflicts = merge(self.base, self.ours, self.theirs)
+        self.assertEqual([(c.ours.kind, c.ours.uuid, c.theirs.kind,
+                           c.theirs.uuid) for c in conflicts],
+                         [(REMOVED, 'diff-company', ADDED, 'diff-department')])
+        # Not linked to their company.
+        self.assertEqual(self.ours.by_uuid('diff-department').super_models,
+                         [])
+
+    def test_conflicts(self):
+        self.ours.by_uuid('diff-person').name = 'Employee'
+        self.theirs.by_uuid('diff-person').name = 'Worker'
+        self.ours.remove_model(self.ours.by_uuid('diff-company'))
+        self.theirs.by_uuid('diff-company').abstract = True
+        self.theirs.by_uuid('diff-address').name = 'Location'
+
+        conflicts = merge(self.base, self.ours, self.theirs)
+        self.assertEqual(sorted((c.theirs.uuid, c.theirs.aspect)
+                                for c in conflicts),
+                         [('diff-company', 'abstract'),
+                          ('diff-person', 'name')])
+        self.assertEqual(self.ours.by_uuid('diff-person').name, 'Employee')
+        self.assertEqual(self.ours.by_uuid('diff-address').name, 'Location')
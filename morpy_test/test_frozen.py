@@ -0,0 +1,106 @@
+#-*- coding: utf-8 -*-
+###############################################################################
+# Name: test_frozen.py
+# Purpose: Testing frozen mograms in shared memory.
+# Author: Igor R. Dejanović <igor DOT dejanovic AT gmail DOT com>
+# Copyright: (c) 2013 Igor R. Dejanović <igor DOT dejanovic AT gmail DOT com>
+# License: MIT License
+###############################################################################
+
+import multiprocessing
+import unittest
+from morpy import Workspace
+from morpy.const import UUID_PRIMITIVE_TYPES_INTEGER
+from morpy.frozen import FrozenExternal, FrozenMogram, freeze
+
+
+def describe_in_worker(name, uuid):
+    with FrozenMogram.attach(name) as frozen:
+        person = frozen.by_uuid(uuid)
+        return (person.name, [p.name for p in person.properties],
+                [r.type.name for r in person.references])
+
+
+class FrozenTest(unittest.TestCase):
+
+    def setUp(self):
+        self.integer = Workspace().get_by_uuid(UUID_PRIMITIVE_TYPES_INTEGER)
+        self.mogram = Workspace().create_mogram(self.id(), Workspace().morp)
+        self.named = self.mogram.create_model('Named', abstract=True)
+        self.person = self.mogram.create_model('Person')
+        self.person.add_super_model(self.named)
+        self.age = self.person.create_property('age', self.integer,
+                                               upper_bound=-1)
+        self.company = self.mogram.create_model('Company')
+        self.employees = self.company.create_reference(
+            'employees', self.person, containment=True, upper_bound=-1)
+        self.employer = self.person.create_reference(
+            'employer', self.company, opposite=self.employees)
+        self.address = self.person.create_model('Address')
+        # Same name deeper in the tree.
+        self.address.create_model('Named')
+        self.frozen = freeze(self.mogram)
+        self.addCleanup(self.frozen.unlink)
+
+    def test_navigation(self):
+        frozen = self.frozen
+        self.assertEqual(frozen.uuid, self.mogram.uuid)
+        self.assertEqual(len(frozen), 5)
+        self.assertEqual([m.name for m in frozen.contents],
+                         ['Named', 'Person', 'Company'])
+
+        person = frozen.by_name('Person')
+        self.assertEqual(person.uuid, self.person.uuid)
+        self.assertFalse(person.abstract)
+        self.assertEqual(person.owner, frozen.root)
+        self.assertEqual(person.super_models, [frozen.by_name('Named')])
+        self.assertTrue(frozen.by_name('Named').abstract)
+
+        age = person.properties[0]
+        self.assertEqual((age.name, age.uuid, age.lower_bound,
+                          age.upper_bound), ('age', self.age.uuid, 1, -1))
+        self.assertEqual(age.owner, person)
+        self.assertEqual(age.type,
+                         FrozenExternal(self.integer.uuid, self.integer.name))
+
+        employer = person.references[0]
+        company = frozen.by_name('Company')
+        employees = company.references[0]
+        self.assertEqual(employer.type, company)
+        self.assertEqual(employer.opposite, employees)
+        self.assertEqual(employees.opposite, employer)
+        self.assertTrue(employees.containment)
+        self.assertFalse(employer.containment)
+
+    def test_lookup(self):
+        frozen = self.frozen
+        # Depth-first order as in Model.by_name.
+        self.assertEqual(frozen.by_name('Named').uuid, self.named.uuid)
+        person = frozen.by_name('Person')
+        inner = person.by_name('Named')
+        self.assertEqual(inner.uuid,
+                         self.person.by_name('Named').uuid)
+        self.assertEqual(inner.owner.owner, person)
+        self.assertIsNone(person.by_name('Company'))
+        self.assertIsNone(person.by_name('Person'))
+        self.assertIsNone(frozen.by_name('Missing'))
+
+        self.assertEqual(frozen.by_uuid(self.address.uuid).name, 'Address')
+        self.assertEqual(person.by_uuid(self.address.uuid).name, 'Address')
+        self.assertIsNone(person.by_uuid(self.company.uuid))
+        self.assertIsNone(frozen.by_uuid(self.mogram.uuid))
+
+    def test_attach(self):
+        with FrozenMogram.attach(self.frozen.name) as attached:
+            self.assertEqual(attached.by_name('Address').uuid,
+                             self.address.uuid)
+
+        context = multiprocessing.get_context('fork')
+        with context.Pool(1) as pool:
+            result = pool.apply(describe_in_worker,
+                                (self.frozen.name, self.person.uuid))
+        self.assertEqual(result, ('Person', ['age'], ['Company']))
+
+
+if __name__ == "__main__":
+    unittest.main()
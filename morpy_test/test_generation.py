@@ -0,0 +1,112 @@
+#-*- coding: utf-8 -*-
+###############################################################################
+# Name: test_generation.py
+# Purpose: Testing generation pipeline.
+# Author: Igor R. Dejanović <igor DOT dejanovic AT gmail DOT com>
+# Copyright: (c) 2013 Igor R. Dejanović <igor DOT dejanovic AT gmail DOT com>
+# License: MIT License
+###############################################################################
+
+import unittest
+from morpy import Workspace
+from morpy.const import MORP
+from morpy.core import Mogram
+from morpy.exceptions import DuplicateGenerator
+from morpy.generation import GenerationPipeline, register_generator, \
+    unregister_generator
+
+
+def to_text(configuration, model):
+    return '%s:%s(%s)' % (configuration.name, model.name,
+                          ','.join(m.name for m in model.contents))
+
+
+class GenerationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.language = Workspace().create_language(self.id())
+        self.configuration = Workspace().create_mogram(self.id() + 'Text',
+                                                       MORP)
+        self.language.generators.append(self.configuration)
+
+        self.mogram = Workspace().create_mogram(self.id() + 'Mogram',
+                                                self.language)
+        self.models = [self.mogram.create_model('M%d' % i) for i in range(4)]
+        self.models[0].create_model('Inner')
+
+        self.calls = []
+
+        def generate(configuration, model):
+            self.calls.append(model.name)
+            return to_text(configuration, model)
+        self.generator = register_generator(self.configuration, generate)
+
+    def tearDown(self):
+        unregister_generator(self.configuration)
+
+    def test_incremental(self):
+        pipeline = GenerationPipeline(self.language)
+        outputs = pipeline.run([self.mogram])
+        self.assertEqual(len(outputs), 4)
+        self.assertEqual(
+            outputs[(self.configuration.name, self.models[0].uuid)],
+            '%s:M0(Inner)' % self.configuration.name)
+        self.assertEqual(pipeline.generated, 4)
+
+        # Nothing changed.
+        pipeline.run([self.mogram])
+        self.assertEqual(pipeline.generated, 0)
+        self.assertEqual(pipeline.reused, 4)
+
+        # Only changed unit is regenerated.
+        self.calls[:] = []
+        self.models[0].by_name('Inner').name = 'Changed'
+        outputs = pipeline.run([self.mogram])
+        self.assertEqual(self.calls, ['M0'])
+        self.assertEqual(
+            outputs[(self.configuration.name, self.models[0].uuid)],
+            '%s:M0(Changed)' % self.configuration.name)
+
+        # New generator version invalidates all outputs.
+        self.generator.version = '2'
+        pipeline.run([self.mogram])
+        self.assertEqual(pipeline.generated, 4)
+
+    def test_cache_across_runs(self):
+        other = Workspace().create_mogram(self.id() + 'Other', self.language)
+        other.create_model('O')
+        pipeline = GenerationPipeline(self.language)
+        pipeline.run([self.mogram])
+        pipeline.run([other])
+        self.assertEqual(pipeline.generated, 1)
+
+        # Outputs of mograms left out of a run are kept.
+        pipeline.run([self.mogram])
+        self.assertEqual(pipeline.generated, 0)
+        self.assertEqual(pipeline.reused, 4)
+
+        # Previous output of a changed unit is dropped.
+        self.models[1].name = 'Changed'
+        pipeline.run([self.mogram])
+        self.assertEqual(pipeline.generated, 1)
+        self.assertEqual(len(pipeline.cache), 5)
+
+    def test_duplicate_configuration_names(self):
+        # Not a free mogram so its name is not checked by the catalog.
+        duplicate = Mogram(self.configuration.name,
+                           conforms_to=Workspace().morp)
+        self.language.generators.append(duplicate)
+        register_generator(duplicate, to_text)
+        try:
+            self.assertRaises(DuplicateGenerator,
+                              GenerationPipeline(self.language).run,
+                              [self.mogram])
+        finally:
+            unregister_generator(duplicate)
+
+    def test_process_pool(self):
+        register_generator(self.configuration, to_text)
+        serial = GenerationPipeline(self.language).run([self.mogram])
+        parallel = GenerationPipeline(self.language, processes=2)
+        self.assertEqual(parallel.run([self.mogram]), serial)
+        self.assertEqual(parallel.generated, 4)
@@ -0,0 +1,72 @@
+#-*- coding: utf-8 -*-
+###############################################################################
+# Name: test_hash.py
+# Purpose: Testing content hashes of MoRP containers.
+# Author: Igor R. Dejanović <igor DOT dejanovic AT gmail DOT com>
+# Copyright: (c) 2013 Igor R. Dejanović <igor DOT dejanovic AT gmail DOT com>
+# License: MIT License
+###############################################################################
+
+import unittest
+from morpy import Workspace
+from morpy.const import MORP, UUID_PRIMITIVE_TYPES_INTEGER
+
+
+class ContentHashTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mogram = Workspace().create_mogram(self.id(), MORP)
+        self.outer = self.mogram.create_model('Outer')
+        self.inner = self.outer.create_model('Inner')
+        self.sibling = self.mogram.create_model('Sibling')
+        self.integer = Workspace().get_by_uuid(UUID_PRIMITIVE_TYPES_INTEGER)
+
+    def test_change_invalidates_path_to_root(self):
+        mogram_hash = self.mogram.content_hash
+        outer_hash = self.outer.content_hash
+        sibling_hash = self.sibling.content_hash
+
+        self.inner.name = 'Renamed'
+
+        # Only hashes on the path to the root are invalidated.
+        self.assertIsNone(self.inner._content_hash)
+        self.assertIsNone(self.outer._content_hash)
+        self.assertIsNone(self.mogram._content_hash)
+        self.assertEqual(self.sibling._content_hash, sibling_hash)
+
+        self.assertNotEqual(self.outer.content_hash, outer_hash)
+        self.assertNotEqual(self.mogram.content_hash, mogram_hash)
+
+        # Hash depends only on the content.
+        self.inner.name = 'Inner'
+        self.assertEqual(self.outer.content_hash, outer_hash)
+        self.assertEqual(self.mogram.content_hash, mogram_hash)
+
+    def test_features_change_hash(self):
+        hashes = [self.mogram.content_hash]
+
+        def changed():
+            new_hash = self.mogram.content_hash
+            self.assertNotIn(new_hash, hashes)
+            hashes.append(new_hash)
+
+        self.inner.abstract = True
+        changed()
+        prop = self.inner.create_property('size', self.integer)
+        changed()
+        prop.upper_bound = -1
+        changed()
+        self.inner.create_reference('sibling', self.sibling)
+        changed()
+        self.inner.add_super_model(self.sibling)
+        changed()
+        self.mogram.add_model(self.inner)
+        changed()
+        self.mogram.remove_model(self.inner)
+        changed()
+
+    def test_morp_hash(self):
+        morp = Workspace().morp
+        self.assertEqual(morp.content_hash, morp.content_hash)
+        for model in morp:
+            self.assertIs(model.owner, morp)
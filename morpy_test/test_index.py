@@ -0,0 +1,134 @@
+#-*- coding: utf-8 -*-
+###############################################################################
+# Name: test_index.py
+# Purpose: Testing workspace name index.
+# Author: Igor R. Dejanović <igor DOT dejanovic AT gmail DOT com>
+# Copyright: (c) 2013 Igor R. Dejanović <igor DOT dejanovic AT gmail DOT com>
+# License: MIT License
+###############################################################################
+
+import unittest
+from morpy import Workspace
+from morpy.const import UUID_PRIMITIVE_TYPES_STRING
+from morpy.core import Mogram
+from morpy import index
+
+
+class NameIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        string = Workspace().get_by_uuid(UUID_PRIMITIVE_TYPES_STRING)
+        self.mogram = Workspace().create_mogram(self.id(), Workspace().morp)
+        self.person = self.mogram.create_model('PersonZq')
+        self.name = self.person.create_property('personZqName', string)
+        self.company = self.mogram.create_model('CompanyZq')
+        self.employees = self.company.create_reference('personZqList',
+                                                       self.person)
+        self.other = Workspace().create_mogram(self.id() + 'Other',
+                                               Workspace().morp)
+        self.other_person = self.other.create_model('PersonZq')
+        # Built after the models are created.
+        Workspace().drop_name_index()
+        self.index = Workspace().name_index
+        self.addCleanup(Workspace().drop_name_index)
+
+    def test_complete(self):
+        self.assertEqual(
+            self.index.complete('personzq', mogram=self.mogram),
+            [self.person, self.employees, self.name])
+        # Objects with equal names are in no particular order.
+        self.assertCountEqual(
+            self.index.complete('PersonZq', case_sensitive=True),
+            [self.person, self.other_person])
+        self.assertCountEqual(self.index.complete('personzq', limit=2),
+                              [self.person, self.other_person])
+        self.assertEqual(
+            self.index.complete('personzq', meta=Workspace().prop),
+            [self.name])
+        self.assertEqual(self.index.complete('personzq', meta='Reference'),
+                         [self.employees])
+        self.assertEqual(
+            self.index.complete('PersonZq', mogram=self.other.name),
+            [self.other_person])
+        self.assertEqual(
+            self.index.complete('personzq', mogram=self.id() + 'Missing'), [])
+        self.assertCountEqual(self.index.find('personzq'),
+                              [self.person, self.other_person])
+        self.assertEqual(self.index.complete('zzzNone'), [])
+
+    def test_maintenance(self):
+        created = self.mogram.create_model('PersonZqAddress')
+        self.assertIn(created, self.index.complete('personzqa'))
+
+        self.person.name = 'HumanZq'
+        self.assertEqual(self.index.find('personzq', mogram=self.mogram), [])
+        self.assertEqual(self.index.find('humanzq'), [self.person])
+        self.person.name = 'PersonZq'
+        self.assertEqual(self.index.find('personzq', mogram=self.mogram),
+                         [self.person])
+
+        # Removed models and models of uncataloged mograms are not found.
+        self.mogram.remove_model(created)
+        self.assertEqual(self.index.complete('personzqa'), [])
+        self.other.add_model(created)
+        self.assertEqual(self.index.complete('personzqa'), [created])
+        free = Mogram('FreeZq', conforms_to=Workspace().morp)
+        model = free.create_model('FreeZqModel')
+        self.assertEqual(self.index.complete('freezq'), [])
+
+        # Cataloged mograms and clones are indexed.
+        Workspace().add_mogram(free)
+        self.assertEqual(self.index.complete('freezq'), [model])
+        clone = self.mogram.clone(self.id() + 'Clone')
+        Workspace().add_mogram(clone)
+        self.assertEqual(self.index.find('companyzq', mogram=clone),
+                         [clone.by_name('CompanyZq')])
+
+    def test_merge(self):
+        size = index.MERGE_THRESHOLD * 2
+        models = [self.mogram.create_model('BulkZq%05d' % i)
+                  for i in range(size)]
+        partition = self.index._partitions[(self.mogram.uuid,
+                                            Workspace().model.uuid)]
+        self.assertLess(len(partition.pending), size)
+        models[0].name = 'RenamedZq'
+        # Removed model is freed.
+        self.mogram.remove_model(models.pop())
+        self.assertEqual(self.index.complete('bulkzq', limit=None),
+                         models[1:])
+        self.index.merge_all()
+        self.assertEqual(partition.pending, [])
+        # Renamed model, PersonZq and CompanyZq.
+        self.assertEqual(len(partition.entries), len(models) + 2)
+        self.assertEqual(self.index.complete('bulkzq', limit=None),
+                         models[1:])
+
+    def test_partitions(self):
+        inner = self.person.create_model('PersonZqInner')
+        inner_name = inner.create_property('personZqInnerName',
+                                           self.person)
+        self.assertEqual(
+            self.index.complete('personzqi', meta=Workspace().prop,
+                                mogram=self.mogram),
+            [inner_name])
+
+        # Moved subtrees are found in the new mogram only.
+        self.other.add_model(self.person)
+        self.assertEqual(self.index.complete('personzq', mogram=self.mogram),
+                         [self.employees])
+        self.assertEqual(
+            self.index.complete('personzq', mogram=self.other,
+                                meta='Property'),
+            [inner_name, self.name])
+
+        # Features follow their owners.
+        self.company.remove_reference(self.employees)
+        self.assertEqual(self.index.complete('personzql', mogram=self.mogram),
+                         [])
+        inner.add_reference(self.employees)
+        self.assertEqual(self.index.complete('personzql', mogram=self.other),
+                         [self.employees])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+#-*- coding: utf-8 -*-
+###############################################################################
+# Name: test_migration.py
+# Purpose: Testing lazy migration of model instances.
+# Author: Igor R. Dejanović <igor DOT dejanovic AT gmail DOT com>
+# Copyright: (c) 2013 Igor R. Dejanović <igor DOT dejanovic AT gmail DOT com>
+# License: MIT License
+###############################################################################
+
+import unittest
+from morpy import Workspace
+from morpy.const import UUID_PRIMITIVE_TYPES_INTEGER, \
+    UUID_PRIMITIVE_TYPES_STRING
+from morpy.exceptions import AbstractInstantiation
+from morpy.migration import extent, migrate_batches, register_migration
+
+
+class MigrationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.integer = Workspace().get_by_uuid(UUID_PRIMITIVE_TYPES_INTEGER)
+        self.string = Workspace().get_by_uuid(UUID_PRIMITIVE_TYPES_STRING)
+        mogram = Workspace().create_mogram(self.id(), Workspace().morp)
+        self.mogram = mogram
+        self.named = mogram.create_model('Named', abstract=True)
+        self.named.create_property('name', self.string)
+        self.person = mogram.create_model('Person')
+        self.person.add_super_model(self.named)
+        self.person.create_property('age', self.integer)
+
+    def test_instances(self):
+        person = self.person.create_instance(name='Ann', age=30)
+        self.assertIs(person.meta, self.person)
+        self.assertEqual((person.name, person.age), ('Ann', 30))
+        self.assertEqual(person.values, {'name': 'Ann', 'age': 30})
+        self.assertEqual(extent(self.person), [person])
+        self.assertRaises(AttributeError, getattr, person, 'missing')
+        self.assertRaises(AttributeError, setattr, person, 'missing', 1)
+        self.assertRaises(AbstractInstantiation, self.named.create_instance)
+
+    def test_meta_version(self):
+        version = self.person.meta_version
+        named_version = self.named.meta_version
+        self.person.create_model('Inner')
+        self.person.name = 'Human'
+        self.assertEqual(self.person.meta_version, version)
+
+        self.person.create_property('email', self.string)
+        self.assertEqual(self.person.meta_version, version + 1)
+        self.person.properties[-1].name = 'mail'
+        self.assertEqual(self.person.meta_version, version + 2)
+        self.assertIn('mail', self.person.features)
+
+        # Changes of super models propagate to inheriting models.
+        self.named.create_property('nick', self.string)
+        self.assertEqual(self.named.meta_version, named_version + 1)
+        self.assertEqual(self.person.meta_version, version + 3)
+        self.assertIn('nick', self.person.features)
+
+    def test_lazy_upgrade(self):
+        person = self.person.create_instance(name='Ann', age=30)
+        age = self.person.properties[0]
+
+        self.person.remove_property(age)
+        self.person.create_property('birth_year', self.integer)
+        register_migration(
+            self.person,
+            lambda values: values.update(birth_year=2013 - values['age']))
+        # Not migrated before access.
+        self.assertEqual(person.__dict__['_values'],
+                         {'name': 'Ann', 'age': 30})
+
+        self.assertEqual(person.birth_year, 1983)
+        self.assertEqual(person.values, {'name': 'Ann', 'birth_year': 1983})
+        self.assertEqual(person.__dict__['_version'],
+                         self.person.meta_version)
+
+        # New instances are created at the current version.
+        other = self.person.create_instance(birth_year=2000)
+        self.assertEqual(other.values, {'birth_year': 2000})
+
+    def test_inherited_migration(self):
+        person = self.person.create_instance(name='Ann')
+        self.named.create_property('nick', self.string)
+        register_migration(self.named,
+                           lambda values: values.update(nick='x'))
+        self.assertEqual(person.nick, 'x')
+
+    def test_batches(self):
+        people = [self.person.create_instance(age=i) for i in range(5)]
+        self.person.create_property('adult', self.integer)
+        register_migration(
+            self.person,
+            lambda values: values.update(adult=values['age'] >= 3))
+
+        self.assertEqual(list(migrate_batches(self.named, batch_size=2)),
+                         [2, 2, 1])
+        self.assertEqual([p.__dict__['_values']['adult'] for p in people],
+                         [False, False, False, True, True])
+        self.assertEqual(list(migrate_batches(self.person)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+#-*- coding: utf-8 -*-
+###############################################################################
+# Name: test_proxy.py
+# Purpose: Testing lazy loading of model subtrees.
+# Author: Igor R. Dejanović <igor DOT dejanovic AT gmail DOT com>
+# Copyright: (c) 2013 Igor R. Dejanović <igor DOT dejanovic AT gmail DOT com>
+# License: MIT License
+###############################################################################
+
+import gc
+import unittest
+from morpy import Workspace
+from morpy.const import UUID_PRIMITIVE_TYPES_STRING
+from morpy.core import Model
+from morpy.proxy import ModelProxy, ProxyLoader, RecordStore
+
+
+class CountingStore(RecordStore):
+
+    def __init__(self):
+        super(CountingStore, self).__init__()
+        self.fetched = []
+
+    def fetch_by_uuid(self, uuid):
+        self.fetched.append(uuid)
+        return super(CountingStore, self).fetch_by_uuid(uuid)
+
+
+class ProxyTest(unittest.TestCase):
+
+    def setUp(self):
+        string = Workspace().get_by_uuid(UUID_PRIMITIVE_TYPES_STRING)
+        root = Model('Root')
+        named = root.create_model('Named', abstract=True)
+        named.create_property('name', string)
+        for i in range(3):
+            part = root.create_model('Part%d' % i)
+            part.add_super_model(named)
+            for j in range(3):
+                part.create_model('Inner%d' % j)
+        company = root.create_model('Company')
+        person = root.by_name('Part0').by_name('Inner0')
+        employees = company.create_reference('employees', person)
+        person.create_reference('employer', company, opposite=employees)
+        self.expected = root.content_hash
+        self.store = CountingStore()
+        self.store.add(root)
+        self.root_uuid = root.uuid
+        # The original objects are freed by reference counting.
+        del root, named, part, company, person, employees
+        self.assertNotIn(self.root_uuid, Workspace().by_uuid)
+
+    def test_lazy_loading(self):
+        loader = ProxyLoader(self.store)
+        root = loader.proxy(self.root_uuid)
+        self.assertIsInstance(root, ModelProxy)
+        self.assertFalse(root.loaded)
+        self.assertEqual(len(self.store.fetched), 1)
+
+        part = root.by_name('Part1')
+        self.assertTrue(root.loaded)
+        self.assertFalse(part.loaded)
+        self.assertEqual(len(part.contents), 3)
+        self.assertTrue(part.loaded)
+        self.assertEqual(part.super_models[0].name, 'Named')
+
+        inner = root.by_name('Part0').by_name('Inner0')
+        employer = inner.references[0]
+        self.assertEqual(employer.type.name, 'Company')
+        self.assertIs(employer.opposite.opposite, employer)
+        self.assertIs(employer.opposite, root.by_name('Company').references[0])
+        self.assertIs(Workspace().get_by_uuid(inner.uuid), inner)
+
+        self.assertEqual(root.content_hash, self.expected)
+        self.assertFalse(root.dirty)
+
+    def test_eviction(self):
+        loader = ProxyLoader(self.store, budget=3)
+        root = loader.proxy(self.root_uuid)
+        for name in ('Part0', 'Part1', 'Part2'):
+            for inner in root.by_name(name):
+                inner.properties
+            self.assertLessEqual(loader.loaded_count, 3)
+        self.assertTrue(root.loaded)
+        self.assertFalse(root.by_name('Part0').loaded)
+
+        # Changed proxies are kept.
+        part = root.by_name('Part1')
+        part.create_model('New')
+        root.by_name('Part2').contents
+        root.by_name('Part0').contents
+        self.assertTrue(part.dirty)
+        self.assertTrue(part.loaded)
+        self.assertTrue(part.by_name('New'))
+
+        # Unloaded subtrees are loaded again.
+        self.assertEqual(len(root.by_name('Part0').by_name('Inner2').contents),
+                         0)
+
+    def test_eviction_keeps_referenced_objects(self):
+        root = Model('Root')
+        target = root.create_model('A').create_model('Target')
+        source = root.create_model('B')
+        reference = source.create_reference('target', target)
+        target.create_reference('source', source, opposite=reference)
+        store = RecordStore()
+        store.add(root)
+        uuid = root.uuid
+        del root, target, source, reference
+        # Types form a cycle.
+        gc.collect()
+        self.assertNotIn(uuid, Workspace().by_uuid)
+
+        loader = ProxyLoader(store, budget=2)
+        root = loader.proxy(uuid)
+        target = root.by_name('A').by_name('Target')
+        reference = root.by_name('B').references[0]
+        opposite = target.references[0]
+        self.assertIs(reference.opposite, opposite)
+        del target, opposite
+        root.by_name('B').contents
+        self.assertFalse(root.by_name('A').loaded)
+
+        # Referenced objects of the unloaded subtree are kept.
+        target = reference.type
+        self.assertEqual(target.name, 'Target')
+        self.assertIs(target.owner, root.by_name('A'))
+        self.assertIs(reference.opposite.opposite, reference)
+        self.assertIs(reference.opposite.owner, target)
+        # And reused when the subtree is loaded again.
+        self.assertIs(root.by_name('A').by_name('Target'), target)
+        self.assertIs(target.references[0], reference.opposite)
+        self.assertFalse(root.dirty)
+
+
+if __name__ == "__main__":
+    unittest.main()
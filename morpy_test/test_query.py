@@ -0,0 +1,78 @@
+#-*- coding: utf-8 -*-
+###############################################################################
+# Name: test_query.py
+# Purpose: Testing path queries.
+# Author: Igor R. Dejanović <igor DOT dejanovic AT gmail DOT com>
+# Copyright: (c) 2013 Igor R. Dejanović <igor DOT dejanovic AT gmail DOT com>
+# License: MIT License
+###############################################################################
+
+import unittest
+from morpy import Workspace
+from morpy.const import MORP, UUID_PRIMITIVE_TYPES_INTEGER, \
+    UUID_PRIMITIVE_TYPES_STRING
+from morpy.exceptions import QuerySyntaxError
+from morpy.query import compile_query, query
+
+
+class QueryTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        integer = Workspace().get_by_uuid(UUID_PRIMITIVE_TYPES_INTEGER)
+        string = Workspace().get_by_uuid(UUID_PRIMITIVE_TYPES_STRING)
+        cls.mogram = Workspace().create_mogram('QueryMogram', MORP)
+        cls.named = cls.mogram.create_model('Named', abstract=True)
+        cls.named.create_property('name', string)
+        cls.person = cls.mogram.create_model('Person')
+        cls.person.add_super_model(cls.named)
+        cls.age = cls.person.create_property('age', integer)
+        cls.person.create_property('nick', string)
+        cls.address = cls.person.create_model('Address')
+        cls.number = cls.address.create_property('number', integer)
+        cls.company = cls.mogram.create_model('Company')
+        cls.employees = cls.company.create_reference('employees', cls.person,
+                                                     upper_bound=-1)
+
+    def names(self, path):
+        return [o.name for o in self.mogram.query(path)]
+
+    def test_example(self):
+        result = self.mogram.query(
+            'contents/*[abstract=false]/properties[type=Integer]')
+        # Results are streamed lazily.
+        self.assertIs(iter(result), result)
+        self.assertEqual(list(result), [self.age])
+
+    def test_steps(self):
+        self.assertEqual(self.names('contents'),
+                         ['Named', 'Person', 'Company'])
+        self.assertEqual(self.names('contents/Person/contents'), ['Address'])
+        self.assertEqual(self.names("contents/'Person'/properties"),
+                         ['age', 'nick'])
+        self.assertEqual(self.names('**'),
+                         ['Named', 'Person', 'Address', 'Company'])
+        self.assertEqual(self.names('**/properties[type=Integer]'),
+                         ['age', 'number'])
+        self.assertEqual(self.names('contents/Company/references'
+                                    '[upper_bound=-1][type=Person]'),
+                         ['employees'])
+        self.assertEqual(self.names('**[isa=Named][abstract!=true]'),
+                         ['Person'])
+        self.assertEqual(self.names('contents/Named/inherited_models'),
+                         ['Person'])
+        self.assertEqual(self.names('**/properties[name=number]/..'),
+                         ['Address'])
+        self.assertEqual(self.names('**[uuid="%s"]' % self.address.uuid),
+                         ['Address'])
+        self.assertEqual(list(query(self.person, 'properties[name=nick]'
+                                    '[meta=Property]/..')), [self.person])
+
+    def test_cache(self):
+        compiled = compile_query('contents/*')
+        self.assertIs(compile_query('contents/*'), compiled)
+
+    def test_syntax_errors(self):
+        for path in ['contents/', 'contents[abstract]', 'contents[=1]',
+                     'contents]', '/contents', 'contents/$']:
+            self.assertRaises(QuerySyntaxError, compile_query, path)
@@ -0,0 +1,171 @@
+#-*- coding: utf-8 -*-
+###############################################################################
+# Name: test_replication.py
+# Purpose: Testing replication of changes between workspaces.
+# Author: Igor R. Dejanović <igor DOT dejanovic AT gmail DOT com>
+# Copyright: (c) 2013 Igor R. Dejanović <igor DOT dejanovic AT gmail DOT com>
+# License: MIT License
+###############################################################################
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+from morpy import Workspace
+from morpy.exceptions import ReplicationError
+from morpy.replication import apply_delta
+from morpy.const import UUID_PRIMITIVE_TYPES_INTEGER, \
+    UUID_PRIMITIVE_TYPES_STRING
+
+# Replica process applies deltas read from stdin and prints description of
+# the replicated mograms after each one.
+REPLICA = '''
+import json, sys
+from morpy import Workspace
+from morpy_test.test_replication import describe
+for line in sys.stdin:
+    Workspace().apply_delta(line.encode('utf-8'))
+    language = Workspace().languages[sys.argv[1]]
+    mogram = Workspace().get_by_uuid(sys.argv[2])
+    print(json.dumps([describe(language.abstract_syntax), describe(mogram),
+                      sorted(Workspace().replicated)]))
+    sys.stdout.flush()
+'''
+
+
+def describe(container):
+    '''
+    Returns plain description of the container and its contents.
+    '''
+    def ident(obj):
+        return getattr(obj, 'uuid', obj)
+
+    description = [container.uuid, container.name]
+    if hasattr(container, 'properties'):
+        description += [
+            container.abstract,
+            [[p.uuid, p.name, ident(p.type), p.lower_bound, p.upper_bound]
+             for p in container.properties],
+            [[r.uuid, r.name, ident(r.type), r.containment,
+              ident(r.opposite), r.lower_bound, r.upper_bound]
+             for r in container.references],
+            [m.uuid for m in container.super_models]]
+    description.append([describe(m) for m in container.contents])
+    return description
+
+
+class ReplicationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.log = Workspace().enable_oplog()
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.language = Workspace().create_language(self.id())
+        self.mogram = Workspace().create_mogram(self.id() + 'Mogram',
+                                                self.language)
+        self.replica = subprocess.Popen(
+            [sys.executable, '-c', REPLICA, self.language.name,
+             self.mogram.uuid],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, cwd=root,
+            universal_newlines=True)
+
+    def tearDown(self):
+        Workspace().disable_oplog()
+        self.replica.stdin.close()
+        self.replica.stdout.close()
+        self.replica.wait()
+
+    def ship(self, since):
+        '''
+        Sends delta to the replica and returns its state.
+        '''
+        delta = Workspace().export_delta(since)
+        self.replica.stdin.write(delta.decode('utf-8') + '\n')
+        self.replica.stdin.flush()
+        state = json.loads(self.replica.stdout.readline())
+        # UUIDs of the objects kept alive by the replica.
+        self.replicated = set(state.pop())
+        return state, len(delta)
+
+    def local_state(self):
+        return [describe(self.language.abstract_syntax),
+                describe(self.mogram)]
+
+    def test_replication(self):
+        integer = Workspace().get_by_uuid(UUID_PRIMITIVE_TYPES_INTEGER)
+        string = Workspace().get_by_uuid(UUID_PRIMITIVE_TYPES_STRING)
+
+        asyn = self.language.abstract_syntax
+        named = asyn.create_model('Named', abstract=True)
+        named.create_property('name', string)
+        person = asyn.create_model('Person')
+        person.add_super_model(named)
+        age = person.create_property('age', integer)
+        company = asyn.create_model('Company')
+        employees = company.create_reference('employees', person,
+                                             upper_bound=-1)
+        person.create_reference('employer', company, opposite=employees)
+        address = person.create_model('Address')
+        john = self.mogram.create_model('John')
+
+        state, full_size = self.ship(0)
+        self.assertEqual(state, self.local_state())
+
+        seq = self.log.last_seq
+        person.name = 'Employee'
+        age.type = string
+        age.upper_bound = -1
+        company.add_model(address)
+        person.remove_super_model(named)
+        company.add_property(age)
+        self.mogram.remove_model(john)
+
+        state, delta_size = self.ship(seq)
+        self.assertEqual(state, self.local_state())
+        self.assertLess(delta_size, full_size)
+
+        # Replaying is idempotent.
+        state, _ = self.ship(0)
+        self.assertEqual(state, self.local_state())
+
+    def test_detached_objects(self):
+        model = self.mogram.create_model('A')
+        self.ship(0)
+
+        # Removed model is kept by the replica while it exists at source.
+        seq = self.log.last_seq
+        self.mogram.remove_model(model)
+        state, _ = self.ship(seq)
+        self.assertEqual(state, self.local_state())
+        seq = self.log.last_seq
+        model.name = 'B'
+        self.mogram.add_model(model)
+        state, _ = self.ship(seq)
+        self.assertEqual(state, self.local_state())
+
+        # Changes of uncataloged clones are replicated too.
+        seq = self.log.last_seq
+        clone = self.mogram.clone()
+        clone.by_name('B').name = 'C'
+        state, _ = self.ship(seq)
+        self.assertIn(clone.by_name('C').uuid, self.replicated)
+
+        # Objects freed at source are freed by the replica.
+        seq = self.log.last_seq
+        self.mogram.remove_model(model)
+        uuid = model.uuid
+        del model
+        state, _ = self.ship(seq)
+        self.assertEqual(state, self.local_state())
+        self.assertNotIn(uuid, self.replicated)
+
+    def test_unknown_object(self):
+        delta = json.dumps({'source': self.id(), 'ops': [
+            [1, 'model', self.id(), None, 'A', False, []],
+            [2, 'set', 'missing', 'name', 'B']]}).encode('utf-8')
+        applied = {}
+        with self.assertRaises(ReplicationError) as context:
+            apply_delta(delta, applied, {})
+        self.assertEqual(context.exception.seq, 2)
+        # Operations before the failed one stay applied.
+        self.assertEqual(applied, {self.id(): 1})
@@ -0,0 +1,103 @@
+#-*- coding: utf-8 -*-
+###############################################################################
+# Name: test_repository.py
+# Purpose: Testing asyncio repository interface.
+# Author: Igor R. Dejanović <igor DOT dejanovic AT gmail DOT com>
+# Copyright: (c) 2013 Igor R. Dejanović <igor DOT dejanovic AT gmail DOT com>
+# License: MIT License
+###############################################################################
+
+import asyncio
+import threading
+import time
+import unittest
+from morpy.repository import AbstractRepository, AsyncRepository
+
+
+class DictRepository(AbstractRepository):
+    '''
+    Slow in-memory repository recording calls.
+    '''
+    def __init__(self, objects):
+        self.objects = objects
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def _record(self, *call):
+        with self.lock:
+            self.calls.append(call)
+        time.sleep(0.01)
+
+    def load(self, name):
+        self._record('load', name)
+        return self.objects[name]
+
+    def save(self, mogram):
+        self._record('save', mogram)
+        self.objects[mogram] = mogram
+
+    def fetch_many(self, uuids):
+        self._record('fetch_many', sorted(uuids))
+        if 'broken' in uuids:
+            raise IOError('broken')
+        return dict((uuid, self.objects[uuid]) for uuid in uuids
+                    if uuid in self.objects)
+
+
+class AsyncRepositoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.repository = DictRepository({'a': 1, 'b': 2, 'c': 3,
+                                          'Mogram': 'mogram'})
+
+    def run_async(self, coroutine_function):
+        async def run():
+            async with AsyncRepository(self.repository, max_workers=2) \
+                    as repo:
+                return await coroutine_function(repo)
+        return asyncio.run(run())
+
+    def test_fetch_batching(self):
+        async def fetch(repo):
+            return await asyncio.gather(*[repo.fetch_by_uuid(uuid)
+                                          for uuid in 'abcabcx'])
+        self.assertEqual(self.run_async(fetch), [1, 2, 3, 1, 2, 3, None])
+        self.assertEqual(self.repository.calls,
+                         [('fetch_many', ['a', 'b', 'c', 'x'])])
+
+    def test_fetch_error(self):
+        async def fetch(repo):
+            return await asyncio.gather(repo.fetch_by_uuid('a'),
+                                        repo.fetch_by_uuid('broken'),
+                                        return_exceptions=True)
+        result = self.run_async(fetch)
+        self.assertIsInstance(result[0], IOError)
+        self.assertIsInstance(result[1], IOError)
+
+    def test_fetch_cancelled(self):
+        async def fetch():
+            repo = AsyncRepository(self.repository, max_workers=1)
+            # The only worker is busy so the batched fetch is queued.
+            loading = asyncio.ensure_future(repo.load('Mogram'))
+            await asyncio.sleep(0)
+            fetching = asyncio.ensure_future(repo.fetch_by_uuid('a'))
+            # Let the fetch request a batch and the batch be flushed.
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            self.assertIn('a', repo._in_progress)
+            repo._executor.shutdown(wait=False, cancel_futures=True)
+            with self.assertRaises(asyncio.CancelledError):
+                await asyncio.wait_for(fetching, 1)
+            self.assertEqual(await loading, 'mogram')
+            self.assertEqual(repo._in_progress, {})
+        asyncio.run(fetch())
+
+    def test_load_and_save(self):
+        async def load(repo):
+            result = await asyncio.gather(*[repo.load('Mogram')
+                                            for _ in range(5)])
+            await repo.save('Other')
+            return result
+        self.assertEqual(self.run_async(load), ['mogram'] * 5)
+        self.assertEqual(self.repository.calls,
+                         [('load', 'Mogram'), ('save', 'Other')])
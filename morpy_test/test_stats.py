@@ -0,0 +1,62 @@
+#-*- coding: utf-8 -*-
+###############################################################################
+# Name: test_stats.py
+# Purpose: Testing MoRP instrumentation.
+# Author: Igor R. Dejanović <igor DOT dejanovic AT gmail DOT com>
+# Copyright: (c) 2013 Igor R. Dejanović <igor DOT dejanovic AT gmail DOT com>
+# License: MIT License
+###############################################################################
+
+import unittest
+from morpy import Workspace
+from morpy.const import MODEL, MORP
+from morpy.core import MoRPContainer
+
+
+class StatsTest(unittest.TestCase):
+
+    def setUp(self):
+        # Bootstrap MoRP outside of the instrumented window.
+        Workspace().morp
+
+    def tearDown(self):
+        Workspace().disable_stats()
+
+    def test_disabled_by_default(self):
+        stats = Workspace().stats()
+        self.assertFalse(stats['enabled'])
+        self.assertEqual(stats['registry_size'], len(Workspace().by_uuid))
+
+    def test_lookups_and_creation(self):
+        events = []
+        Workspace().enable_stats(sink=events.append)
+
+        mogram = Workspace().create_mogram('StatsMogram', MORP)
+        outer = mogram.create_model('Outer')
+        inner = outer.create_model('Inner')
+
+        self.assertIs(mogram.by_name('Inner'), inner)
+        self.assertIs(mogram.by_uuid(outer.uuid), outer)
+        self.assertIsNone(mogram.by_name('Missing'))
+        MoRPContainer(mogram.contents).by_meta(Workspace().model)
+
+        stats = Workspace().stats()
+        self.assertTrue(stats['enabled'])
+        operations = stats['operations']
+        self.assertEqual(operations['by_name']['calls'], 2)
+        self.assertEqual(operations['by_name']['visited'], 4)
+        self.assertEqual(operations['by_uuid']['calls'], 1)
+        self.assertEqual(operations['by_uuid']['visited'], 1)
+        self.assertEqual(operations['by_meta']['calls'], 1)
+        self.assertEqual(stats['created'][MODEL], 3)
+        self.assertEqual(len(events), 4)
+        self.assertEqual(events[0]['operation'], 'by_name')
+        self.assertEqual(events[0]['key'], 'Inner')
+
+    def test_slow_threshold(self):
+        events = []
+        Workspace().enable_stats(sink=events.append, slow_threshold=3600)
+        Workspace().morp.by_name(MODEL)
+        self.assertEqual(events, [])
+        self.assertEqual(Workspace().stats()['operations']['by_name']['calls'],
+                         1)